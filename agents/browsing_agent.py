@@ -1,6 +1,6 @@
 import asyncio
-from typing import Tuple
-from config import MODEL_NAME, TEMPERATURE, MAX_WORKERS, DATABASE
+from typing import Tuple, Optional
+from config import MODEL_NAME, TEMPERATURE, MAX_PAGE_FETCHES, MAX_LLM_CALLS, STREAMING_PIPELINE, HARD_FILTERS
 from autogen_core.base import CancellationToken
 from autogen_core.components import default_subscription
 # from autogen_core import MessageContext, TopicId
@@ -13,25 +13,63 @@ from autogen_magentic_one.messages import (
 from autogen_magentic_one.utils import message_content_to_str
 from autogen_magentic_one.agents.base_worker import BaseWorker
 from pydantic import BaseModel
-from openai import AsyncOpenAI
-from playwright.async_api import async_playwright
+from utils.llm_cache import CachedAsyncOpenAI
+from utils.browser_pool import get_browser_pool
+from utils.page_loading import LISTING_PAGE
+from utils.listing_cache import get_listing_cache
+from utils.streaming import StreamingScorer
+from utils.run_context import RunContext
+from utils.result_store import get_result_store
+from utils.image_preprocessing import ImagePreprocessor
+from utils.listing_extraction import extract_listing_facts, format_listing_facts
+from utils.text_compaction import compact_listing_text
+from utils.hard_filters import HardFilter
+from agents.description_agent import score_description
+from agents.image_analysis_agent import score_listing_images
 from bs4 import BeautifulSoup
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import uuid
-import json
-import sqlite3
-from flask import g
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-    return db
+def parse_listing_html(html_content: str) -> dict:
+    # Prefer the compact record from the page's embedded JSON over the full page text
+    facts = extract_listing_facts(html_content)
+    if facts:
+        return {
+            "text": format_listing_facts(facts),
+            "images": facts["photos"],
+            "facts": facts,
+        }
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Remove unnecessary tags
+    for tag in soup(["script", "style", "noscript", "meta", "link"]):
+        tag.decompose()
+
+    clean_text = soup.get_text(separator="\n", strip=True)
+
+    # Extract images (preserve 'src' attributes)
+    images = []
+    for img in soup.find_all("img"):
+        src = img.get("src")
+        if src and src.startswith("http"):  # Filter for valid URLs
+            images.append(src)
+
+    listing_content = {
+        "text": clean_text,
+        "images": images,
+        "facts": None,
+    }
+
+    return listing_content
 
 class BrowsingInput(BaseModel):
     listing_urls: list[str]
 
+class StreamingBrowsingInput(BaseModel):
+    criteria: str
+    listing_urls: list[str]
+
 @default_subscription
 class BrowsingAgent(BaseWorker):
     DEFAULT_DESCRIPTION = "An agent that visits URLs provided by the Listing Fetch Agent and generates a summary of each listing."
@@ -40,9 +78,19 @@ class BrowsingAgent(BaseWorker):
         self,
         description: str = DEFAULT_DESCRIPTION,
         client = None,  # Optional model client
+        max_page_fetches: int = MAX_PAGE_FETCHES,
+        max_llm_calls: int = MAX_LLM_CALLS,
+        streaming: bool = STREAMING_PIPELINE,
+        hard_filters: bool = HARD_FILTERS,
+        run_context: Optional[RunContext] = None,
     ) -> None:
         super().__init__(description)
-        self._openai_client = AsyncOpenAI()
+        self._openai_client = CachedAsyncOpenAI("BrowsingAgent")
+        self._max_page_fetches = max_page_fetches
+        self._max_llm_calls = max_llm_calls
+        self._streaming = streaming
+        self._hard_filters = hard_filters
+        self._run_context = run_context or RunContext()
     
     async def _generate_reply(self, cancellation_token: CancellationToken) -> Tuple[bool, UserContent]:
         """
@@ -52,14 +100,20 @@ class BrowsingAgent(BaseWorker):
         :return: Tuple of (request_halt, response)
         """
         try:
-            context = " ".join([str(msg.content) for msg in self._chat_history[-5:]])
-            listing_urls = await self._parse_context(context)
+            if self._streaming:
+                return False, await self._generate_streaming_reply()
+
+            if self._run_context.has("listing_urls"):
+                listing_urls = self._run_context.listing_urls
+            else:
+                context = " ".join([str(msg.content) for msg in self._chat_history[-5:]])
+                listing_urls = await self._parse_context(context)
             scraped_listings = await self._scrape_listings(listing_urls)
             
-            result_id = str(uuid.uuid4())
-            db = get_db()
-            db.execute("INSERT INTO my_table (id, data) VALUES (?, ?)", (result_id, json.dumps(scraped_listings)))
-            db.commit()
+            # Results are stored under the run ID, which the next stages receive as the result ID
+            result_id = self._run_context.final_result_id or str(uuid.uuid4())
+            get_result_store().save_summaries(result_id, scraped_listings)
+            self._run_context.browsing_result_id = result_id
             
             response = f"Browsing Agent Result ID: {result_id}"
             return False, response
@@ -81,6 +135,7 @@ class BrowsingAgent(BaseWorker):
 
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="parse_context",
             messages=[{"role": "user", "content": prompt}],
             response_format=BrowsingInput,
         )
@@ -89,89 +144,151 @@ class BrowsingAgent(BaseWorker):
         listing_urls = browsing_input.listing_urls
         return listing_urls
     
-    async def _scrape_listings(self, listing_urls: list[str]) -> list[dict]:
-        async def get_listing_content(url: str) -> dict:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        "--no-sandbox",
-                        "--disable-setuid-sandbox",
-                        "--disable-dev-shm-usage",
-                        "--disable-gpu",
-                        "--disable-accelerated-2d-canvas",
-                        "--no-zygote",
-                        "--single-process",  # Required for some Docker environments
-                        "--disable-web-security",
-                    ],
-                )
-                page = await browser.new_page()
-                await page.goto(url)
-                await page.wait_for_load_state('networkidle')
-                html_content = await page.content()
-                await browser.close()
+    async def _generate_streaming_reply(self) -> str:
+        """
+        Browse the listings and hand each one to description and image scoring as soon as
+        its summary is ready, storing the results of all three stages.
+
+        The embedding pre-filter doesn't apply here: which listings are closest to the criteria
+        is only known once every summary is in, by which time they are all being scored.
+        """
+        if self._run_context.has("criteria", "listing_urls"):
+            criteria, listing_urls = self._run_context.criteria, self._run_context.listing_urls
+        else:
+            context = " ".join([str(msg.content) for msg in self._chat_history])
+            criteria, listing_urls = await self._parse_streaming_context(context)
+
+        async def score_images(criteria: str, image_urls: list[str]):
+            image_urls = await preprocessor.prepare(image_urls)
+            return await score_listing_images(self._openai_client, criteria, image_urls)
+
+        async with ImagePreprocessor() as preprocessor:
+            scorer = StreamingScorer(
+                criteria,
+                lambda criteria, summary: score_description(self._openai_client, criteria, summary),
+                score_images,
+                on_scored=lambda kind, url, score: self._run_context.publish(f"{kind}_scored", url=url, score=score),
+            )
+            scraped_listings = await self._scrape_listings(listing_urls, on_listing=scorer.submit)
+            description_agent_result, image_agent_result = await scorer.drain()
+
+        result_id = self._run_context.final_result_id or str(uuid.uuid4())
+        result_store = get_result_store()
+        result_store.save_summaries(result_id, scraped_listings)
+        result_store.save_description_scores(result_id, description_agent_result)
+        result_store.save_image_scores(result_id, image_agent_result)
+        self._run_context.browsing_result_id = result_id
+        self._run_context.description_result_id = result_id
+        self._run_context.image_result_id = result_id
+
+        return (
+            f"Browsing Agent Result ID: {result_id}\n"
+            f"Description Agent Result ID: {result_id}\n"
+            f"Image Analysis Agent Result ID: {result_id}"
+        )
 
-            soup = BeautifulSoup(html_content, 'html.parser')
+    async def _parse_streaming_context(self, context: str):
+        prompt = f"""
+        Your task is to parse the chat history and extract a dictionary with two fields:
+
+        1. **criteria**: A string containing the user's preferences.
+        2. **listing_urls**: A list of every url returned by the Listing Fetch Agent.
+
+        If a field is missing, return an empty value for it. Ensure the list is complete and consistent with the chat history.
+
+        Chat history:
+        {context}
+        """.strip()
+
+        response = await self._openai_client.beta.chat.completions.parse(
+            model=MODEL_NAME,
+            call_site="parse_context",
+            messages=[{"role": "user", "content": prompt}],
+            response_format=StreamingBrowsingInput,
+        )
 
-            # Remove unnecessary tags
-            for tag in soup(["script", "style", "noscript", "meta", "link"]):
-                tag.decompose()
+        browsing_input = response.choices[0].message.parsed
+        return browsing_input.criteria, browsing_input.listing_urls
 
-            clean_text = soup.get_text(separator="\n", strip=True)
+    async def _scrape_listings(self, listing_urls: list[str], on_listing=None) -> list[dict]:
+        """
+        Scrape and summarize every listing, dropping listings that break the user's hard
+        filters before they are summarized.
 
-            # Extract images (preserve 'src' attributes)
-            images = []
-            for img in soup.find_all("img"):
-                src = img.get("src")
-                if src and src.startswith("http"):  # Filter for valid URLs
-                    images.append(src)
+        :param listing_urls: URLs of the listings to visit
+        :param on_listing: Optional callback invoked with each summarized listing as soon as it is ready
+        :return: List of dictionaries with url, summary and image_urls
+        """
+        # Page fetches and LLM calls are limited separately so slow summaries don't hold browser pages
+        fetch_semaphore = asyncio.Semaphore(self._max_page_fetches)
+        llm_semaphore = asyncio.Semaphore(self._max_llm_calls)
+        total = len(listing_urls)
+        finished = 0
+        hard_filter = HardFilter.from_parsed_fields(self._run_context.parsed_fields) if self._hard_filters else None
 
-            listing_content = {
-                "text": clean_text,
-                "images": images
-            }
+        async def get_listing_content(url: str) -> dict:
+            listing_cache = get_listing_cache()
+            cached_content = listing_cache.get(url)
+            if cached_content:
+                return cached_content
 
+            async with fetch_semaphore:
+                html_content = await get_browser_pool().fetch_html(url, LISTING_PAGE)
+            # Parse off the event loop so other listings keep making progress
+            listing_content = await asyncio.to_thread(parse_listing_html, html_content)
+            listing_cache.put(url, listing_content)
             return listing_content
 
         async def content_to_summary(listing_text: str) -> str:
+            # Bound prompt size so long pages with many reviews stay within a predictable cost
+            listing_text = compact_listing_text(listing_text)
             system_prompt = "Given HTML of an Airbnb listing, write a summary of the contents of the page, including all details about the listing such that the summary will be easily ingestible for a downstream AI to analyze in terms of matching user preferences."
 
             messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": listing_text},
             ]
-            response = await self._openai_client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=messages,
-                temperature=TEMPERATURE,
-            )
+            async with llm_semaphore:
+                response = await self._openai_client.chat.completions.create(
+                    model=MODEL_NAME,
+                    call_site="summary",
+                    messages=messages,
+                    temperature=TEMPERATURE,
+                )
             summary = response.choices[0].message.content.strip()
             return summary
 
         async def summarize_listing(url):
-            listing_content = await get_listing_content(url)
-            summary = await content_to_summary(listing_content['text'])
-            print("Finished a summary")
-            return {
-                "url": url,
-                "summary": summary,
-                "image_urls": listing_content['images']
-            }
-
-        results = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            loop = asyncio.get_event_loop()
-            tasks = [
-                loop.run_in_executor(executor, asyncio.run, summarize_listing(url))
-                for url in listing_urls
-            ]
-            for task in asyncio.as_completed(tasks):
-                try:
-                    result = await task
-                    results.append(result)
-                except Exception as e:
-                    print(f"Error summarizing listing: {e}, skipping this one...")
-        return results
+            nonlocal finished
+            try:
+                listing_content = await get_listing_content(url)
+                reasons = hard_filter.violations(listing_content.get('facts')) if hard_filter else []
+                if reasons:
+                    self._run_context.filtered_listings.append({"url": url, "reasons": reasons})
+                    self._run_context.publish("listing_filtered", url=url, reasons=reasons)
+                    print(f"Dropped listing {url}: {'; '.join(reasons)}")
+                    return None
+                summary = await content_to_summary(listing_content['text'])
+                result = {
+                    "url": url,
+                    "summary": summary,
+                    "image_urls": listing_content['images'],
+                    "facts": listing_content.get('facts'),
+                }
+                self._run_context.summarized_listings.append(result)
+                self._run_context.publish("listing_summarized", url=url, summary=summary)
+                if on_listing:
+                    on_listing(result)
+                return result
+            except Exception as e:
+                print(f"Error summarizing listing {url}: {e}, skipping this one...")
+                return None
+            finally:
+                finished += 1
+                print(f"Finished listing {finished}/{total}: {url}")
+
+        results = await asyncio.gather(*(summarize_listing(url) for url in listing_urls))
+        return [result for result in results if result is not None]
 
     async def ainput(self, prompt: str) -> str:
         """
@@ -1,7 +1,6 @@
 import asyncio
-import json
-from typing import Tuple, Dict, List
-from config import MODEL_NAME, TEMPERATURE, DATABASE
+from typing import Tuple, Dict, List, Optional
+from config import MODEL_NAME, TEMPERATURE, EMBEDDING_PREFILTER
 from autogen_core.base import CancellationToken
 from autogen_core.components import default_subscription
 # from autogen_core import MessageContext, TopicId
@@ -14,17 +13,10 @@ from autogen_magentic_one.messages import (
 from autogen_magentic_one.utils import message_content_to_str
 from autogen_magentic_one.agents.base_worker import BaseWorker
 from pydantic import BaseModel
-from openai import AsyncOpenAI
-import uuid
-import json
-import sqlite3
-from flask import g
-
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-    return db
+from utils.llm_cache import CachedAsyncOpenAI
+from utils.run_context import RunContext
+from utils.result_store import get_result_store
+from utils.embeddings import EmbeddingPreFilter
 
 class DescriptionInput(BaseModel):
     criteria: str
@@ -37,6 +29,74 @@ class DescriptionOutput(BaseModel):
 class DescriptionOutputs(BaseModel):
     outputs: list[DescriptionOutput]
 
+def description_system_prompt(criteria: str) -> str:
+    return f"""
+        You are a validation assistant. Given user criteria and Airbnb listings, you must:
+
+        1. Evaluate how well each listing meets the given user criteria. Consider the user's preferences as a set of desired attributes, such as location, travel dates, the number of guests, price range, number of bedrooms and bathrooms, amenities (like a kitchen, pool, or WiFi), views (like ocean or garden views), and any additional details the user may have provided.
+
+        For example:
+        - Location: If the user wants a rental in Paris, then listings in Paris should score higher than those outside the city.
+        - Travel Dates: If the user has specific check-in and check-out dates, a listing that is available for those dates should score higher than one that is not.
+        - Number of Guests: If the user needs accommodation for four guests, a listing that comfortably fits four (e.g., with enough beds) should score higher than one that only fits two.
+        - Price Range: If the user sets a minimum and maximum price per night, a listing that falls within that range should score higher than one that is too expensive or significantly cheaper than expected.
+        - Bedrooms and Bathrooms: If the user wants two bedrooms and two bathrooms, a listing that meets or exceeds that requirement should score higher than one that does not.
+        - Amenities: If the user desires certain amenities (like a fully equipped kitchen, pool, or reliable WiFi), a listing that provides these features should score higher than one that lacks them.
+        - Views: If the user requests an ocean view, listings with actual ocean views should score higher than those with no view or a different view.
+        - Additional Details: Consider any extra preferences, such as proximity to landmarks, pet-friendliness, or interior style. Listings that meet these details should score higher.
+
+        Keep in mind that user criteria may be vague or broad. If the user says “affordable” without specifying a price range, consider what might be reasonable in the given context. If the user says “close to the beach,” and the listing is within walking distance, treat that as a positive match.
+
+        2. Assign a score from 1 to 5 (5 is best) for each listing and provide a brief justification.
+
+        User criteria:
+        {criteria}
+        """.strip()
+
+async def score_description(openai_client, criteria: str, description: str) -> DescriptionOutput:
+    """
+    Scores a single listing description, used when listings are streamed in one at a time.
+    """
+    messages = [
+        {"role": "system", "content": description_system_prompt(criteria)},
+        {"role": "user", "content": f"Listing 1:\n{description}\n"},
+    ]
+    response = await openai_client.beta.chat.completions.parse(
+        model=MODEL_NAME,
+        call_site="score_description",
+        messages=messages,
+        response_format=DescriptionOutput,
+    )
+    return response.choices[0].message.parsed
+
+async def prefilter_listings(
+    prefilter: EmbeddingPreFilter,
+    run_context: RunContext,
+    criteria: str,
+    listings: list[dict],
+) -> list[dict]:
+    """
+    Pick the listings most similar to the criteria before any of them is sent to the LLM.
+
+    The kept URLs are recorded in the run context as `prefiltered_urls`, so the Description and
+    Image Analysis Agents score the same listings whichever of them runs first.
+
+    :param listings: Dictionaries with url and summary
+    :return: The kept listings in their original order
+    """
+    selected, similarities = await prefilter.select(criteria, listings)
+    selected_urls = {entry['url'] for entry in selected}
+    dropped = [
+        {'url': entry['url'], 'similarity': similarity}
+        for entry, similarity in zip(listings, similarities)
+        if entry['url'] not in selected_urls
+    ]
+    run_context.prefiltered_urls = [entry['url'] for entry in selected]
+    if dropped:
+        print(f"Embedding pre-filter kept {len(selected)}/{len(listings)} listings")
+        run_context.publish("listings_prefiltered", kept=len(selected), dropped=dropped)
+    return selected
+
 @default_subscription
 class DescriptionAgent(BaseWorker):
     DEFAULT_DESCRIPTION = "An agent that scores Airbnb listings based on their descriptions."
@@ -45,10 +105,15 @@ class DescriptionAgent(BaseWorker):
         self,
         description: str = DEFAULT_DESCRIPTION,
         client=None,  
+        run_context: Optional[RunContext] = None,
+        prefilter: Optional[EmbeddingPreFilter] = None,
     ) -> None:
         super().__init__(description)
         # self._client = client
-        self._openai_client = AsyncOpenAI()
+        self._openai_client = CachedAsyncOpenAI("DescriptionAgent")
+        self._run_context = run_context or RunContext()
+        # A pre-filter can also be passed in, e.g. one with a local embedding provider
+        self._prefilter = prefilter or (EmbeddingPreFilter() if EMBEDDING_PREFILTER else None)
 
     async def _generate_reply(
         self, 
@@ -71,8 +136,13 @@ class DescriptionAgent(BaseWorker):
 
         try:
             context = " ".join([str(msg.content) for msg in self._chat_history])
-            criteria, browsing_agent_result = await self._parse_context(context)
-            
+            criteria, result_id, browsing_agent_result = await self._parse_context(context)
+            if self._prefilter and self._run_context.prefiltered_urls is None:
+                await prefilter_listings(self._prefilter, self._run_context, criteria, browsing_agent_result)
+            if self._run_context.prefiltered_urls is not None:
+                kept_urls = set(self._run_context.prefiltered_urls)
+                browsing_agent_result = [entry for entry in browsing_agent_result if entry['url'] in kept_urls]
+
             listing_urls = [entry['url'] for entry in browsing_agent_result]
             descriptions = [entry['summary'] for entry in browsing_agent_result]
             description_outputs = await self._score_listings(criteria, descriptions)
@@ -82,11 +152,11 @@ class DescriptionAgent(BaseWorker):
                     'reasoning': description_output.reasoning,
                 } for i, description_output in enumerate(description_outputs.outputs)
             }
+            for url, result in description_agent_result.items():
+                self._run_context.publish("description_scored", url=url, score=result['score'])
 
-            result_id = str(uuid.uuid4())
-            db = get_db()
-            db.execute("INSERT INTO my_table (id, data) VALUES (?, ?)", (result_id, json.dumps(description_agent_result)))
-            db.commit()
+            get_result_store().save_description_scores(result_id, description_agent_result)
+            self._run_context.description_result_id = result_id
             
             response = f"Description Agent Result ID: {result_id}"
             return False, response
@@ -95,6 +165,16 @@ class DescriptionAgent(BaseWorker):
             return False, f"Error validating listings: {str(e)}"
 
     async def _parse_context(self, context: str):
+        if self._run_context.has("criteria", "browsing_result_id"):
+            criteria = self._run_context.criteria
+            browsing_agent_result_id = self._run_context.browsing_result_id
+        else:
+            criteria, browsing_agent_result_id = await self._extract_context(context)
+
+        browsing_agent_result = get_result_store().get_summaries(browsing_agent_result_id)
+        return criteria, browsing_agent_result_id, browsing_agent_result
+
+    async def _extract_context(self, context: str):
         # Prepare the system prompt
         prompt = f"""
         Your task is to parse the chat history and extract a dictionary with two fields:  
@@ -109,19 +189,14 @@ class DescriptionAgent(BaseWorker):
         # Call the OpenAI API
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="parse_context",
             messages=[{"role": "user", "content": prompt}],
             response_format=DescriptionInput,
         )
         decription_input = response.choices[0].message.parsed
         criteria = decription_input.criteria
         browsing_agent_result_id = decription_input.browsing_agent_result_id
-        
-        db = get_db()
-        cur = db.execute("SELECT id, data FROM my_table WHERE id = ?", (browsing_agent_result_id,))
-        row = cur.fetchone()
-        browsing_agent_result = json.loads(row[1])
-        
-        return criteria, browsing_agent_result
+        return criteria, browsing_agent_result_id
 
     async def _score_listings(
         self, 
@@ -140,28 +215,7 @@ class DescriptionAgent(BaseWorker):
             List[int]: A list of integers representing scores for each listing
         """
         # Prepare the system prompt
-        system_prompt = f"""
-        You are a validation assistant. Given user criteria and Airbnb listings, you must:
-
-        1. Evaluate how well each listing meets the given user criteria. Consider the user's preferences as a set of desired attributes, such as location, travel dates, the number of guests, price range, number of bedrooms and bathrooms, amenities (like a kitchen, pool, or WiFi), views (like ocean or garden views), and any additional details the user may have provided.
-
-        For example:
-        - Location: If the user wants a rental in Paris, then listings in Paris should score higher than those outside the city.
-        - Travel Dates: If the user has specific check-in and check-out dates, a listing that is available for those dates should score higher than one that is not.
-        - Number of Guests: If the user needs accommodation for four guests, a listing that comfortably fits four (e.g., with enough beds) should score higher than one that only fits two.
-        - Price Range: If the user sets a minimum and maximum price per night, a listing that falls within that range should score higher than one that is too expensive or significantly cheaper than expected.
-        - Bedrooms and Bathrooms: If the user wants two bedrooms and two bathrooms, a listing that meets or exceeds that requirement should score higher than one that does not.
-        - Amenities: If the user desires certain amenities (like a fully equipped kitchen, pool, or reliable WiFi), a listing that provides these features should score higher than one that lacks them.
-        - Views: If the user requests an ocean view, listings with actual ocean views should score higher than those with no view or a different view.
-        - Additional Details: Consider any extra preferences, such as proximity to landmarks, pet-friendliness, or interior style. Listings that meet these details should score higher.
-
-        Keep in mind that user criteria may be vague or broad. If the user says “affordable” without specifying a price range, consider what might be reasonable in the given context. If the user says “close to the beach,” and the listing is within walking distance, treat that as a positive match.
-
-        2. Assign a score from 1 to 5 (5 is best) for each listing and provide a brief justification.
-
-        User criteria:
-        {criteria}
-        """.strip()
+        system_prompt = description_system_prompt(criteria)
 
         # Add listings as a user message
         listings_str = ""
@@ -176,6 +230,7 @@ class DescriptionAgent(BaseWorker):
         ]
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="score_descriptions",
             messages=messages,
             response_format=DescriptionOutputs,
         )
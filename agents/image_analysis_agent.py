@@ -1,6 +1,7 @@
 import asyncio
-from typing import Tuple
-from config import MODEL_NAME, TEMPERATURE, DATABASE
+import time
+from typing import Tuple, Optional
+from config import MODEL_NAME, TEMPERATURE, MAX_IMAGE_SCORING_CALLS, EMBEDDING_PREFILTER
 from autogen_core.base import CancellationToken
 from autogen_core.components import default_subscription
 # from autogen_core import MessageContext, TopicId
@@ -13,17 +14,12 @@ from autogen_magentic_one.messages import (
 from autogen_magentic_one.utils import message_content_to_str
 from autogen_magentic_one.agents.base_worker import BaseWorker
 from pydantic import BaseModel
-from openai import AsyncOpenAI
-import uuid
-import json
-import sqlite3
-from flask import g
-
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-    return db
+from utils.llm_cache import CachedAsyncOpenAI
+from utils.run_context import RunContext
+from utils.result_store import get_result_store
+from utils.image_preprocessing import ImagePreprocessor
+from utils.embeddings import EmbeddingPreFilter
+from agents.description_agent import prefilter_listings
 
 class ImageInput(BaseModel):
     criteria: str
@@ -33,6 +29,48 @@ class ImageOutput(BaseModel):
     score: int
     reasoning: str
 
+async def score_listing_images(openai_client, criteria: str, listing_images: list[str]) -> ImageOutput:
+    """
+    Scores a single listing based on how well its images match the user's criteria.
+
+    Args:
+        openai_client (AsyncOpenAI): Client used for the vision call.
+        criteria (str): The user's criteria for scoring.
+        listing_images (list[str]): The image URLs of one listing.
+
+    Returns:
+        ImageOutput: The score and reasoning for the listing.
+    """
+    # Prepare the system prompt
+    system_prompt = f"""
+    Your task is to score an Airbnb listing based on how well the images of the listing match the user's criteria.
+
+    User's criteria:
+    {criteria}
+
+    You will be provided the images. Output only your score as an integer from 1 to 5, 5 being the highest.
+    """.strip()
+
+    # All images go in one user message as image parts; the model ignores image fields anywhere else
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": [{"type": "image_url", "image_url": {"url": image_url}} for image_url in listing_images],
+        },
+    ]
+
+    # Call the OpenAI API
+    response = await openai_client.beta.chat.completions.parse(
+        model=MODEL_NAME,
+        call_site="score_images",
+        messages=messages,
+        response_format=ImageOutput,
+    )
+
+    # Extract the score
+    return response.choices[0].message.parsed
+
 @default_subscription
 class ImageAnalysisAgent(BaseWorker):
     DEFAULT_DESCRIPTION = "An agent that scores Airbnb listings based on their images."
@@ -41,10 +79,17 @@ class ImageAnalysisAgent(BaseWorker):
         self,
         description: str = DEFAULT_DESCRIPTION,
         client = None,  # Optional model client
+        run_context: Optional[RunContext] = None,
+        max_image_scoring_calls: int = MAX_IMAGE_SCORING_CALLS,
+        prefilter: Optional[EmbeddingPreFilter] = None,
     ) -> None:
         super().__init__(description)
         # self._client = client
-        self._openai_client = AsyncOpenAI()
+        self._openai_client = CachedAsyncOpenAI("ImageAnalysisAgent")
+        self._run_context = run_context or RunContext()
+        self._max_image_scoring_calls = max_image_scoring_calls
+        # Listings the pre-filter drops get no description score and so are never ranked
+        self._prefilter = prefilter or (EmbeddingPreFilter() if EMBEDDING_PREFILTER else None)
     
     async def _generate_reply(self, cancellation_token: CancellationToken) -> Tuple[bool, UserContent]:
         """
@@ -61,22 +106,17 @@ class ImageAnalysisAgent(BaseWorker):
         try:
             # Prepare context from chat history
             context = " ".join([str(msg.content) for msg in self._chat_history])
-            criteria, browsing_agent_result = await self._parse_context(context)
-            
-            listing_urls = [entry['url'] for entry in browsing_agent_result]
-            image_urls = [entry['image_urls'] for entry in browsing_agent_result]
-            image_outputs = await self._score_images(criteria, image_urls)
-            image_agent_result = {
-                listing_urls[i]: {
-                    'score': image_output.score,
-                    'reasoning': image_output.reasoning,
-                } for i, image_output in enumerate(image_outputs)
-            }
-
-            result_id = str(uuid.uuid4())
-            db = get_db()
-            db.execute("INSERT INTO my_table (id, data) VALUES (?, ?)", (result_id, json.dumps(image_agent_result)))
-            db.commit()
+            criteria, result_id, image_urls = await self._parse_context(context)
+            if self._prefilter and self._run_context.prefiltered_urls is None:
+                listings = get_result_store().get_summaries(result_id)
+                await prefilter_listings(self._prefilter, self._run_context, criteria, listings)
+            if self._run_context.prefiltered_urls is not None:
+                kept_urls = set(self._run_context.prefiltered_urls)
+                image_urls = {url: images for url, images in image_urls.items() if url in kept_urls}
+            image_agent_result = await self._score_images(criteria, image_urls)
+
+            get_result_store().save_image_scores(result_id, image_agent_result)
+            self._run_context.image_result_id = result_id
             
             response = f"Image Analysis Agent Result ID: {result_id}"
             return False, response
@@ -85,6 +125,17 @@ class ImageAnalysisAgent(BaseWorker):
             return False, f"Error: {str(e)}"
 
     async def _parse_context(self, context: str):
+        if self._run_context.has("criteria", "browsing_result_id"):
+            criteria = self._run_context.criteria
+            browsing_agent_result_id = self._run_context.browsing_result_id
+        else:
+            criteria, browsing_agent_result_id = await self._extract_context(context)
+
+        # Only the image URLs are needed, not the summaries
+        image_urls = get_result_store().get_image_urls(browsing_agent_result_id)
+        return criteria, browsing_agent_result_id, image_urls
+
+    async def _extract_context(self, context: str):
         # Prepare the system prompt
         prompt = f"""
         Your task is to parse the chat history and extract a dictionary with two fields:  
@@ -99,6 +150,7 @@ class ImageAnalysisAgent(BaseWorker):
         # Call the OpenAI API
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="parse_context",
             messages=[{"role": "user", "content": prompt}],
             response_format=ImageInput,
         )
@@ -106,67 +158,47 @@ class ImageAnalysisAgent(BaseWorker):
         criteria = image_input.criteria
 
         browsing_agent_result_id = image_input.browsing_agent_result_id
-        
-        db = get_db()
-        cur = db.execute("SELECT id, data FROM my_table WHERE id = ?", (browsing_agent_result_id,))
-        row = cur.fetchone()
-        browsing_agent_result = json.loads(row[1])
-        
-        return criteria, browsing_agent_result
+        return criteria, browsing_agent_result_id
     
-    async def _score_images(self, criteria: str, image_urls: list[list[str]]) -> list[int]:
+    async def _score_images(self, criteria: str, image_urls: dict[str, list[str]]) -> dict[str, dict]:
         """
-        Takes in a list of lists of image URLs, each list corresponding to one listing,
-        and scores the listings based on how well the images match the user's criteria.
+        Takes in the image URLs of each listing and scores the listings concurrently
+        based on how well the images match the user's criteria.
 
         Args:
             criteria (str): The user's criteria for scoring.
-            image_urls (list[list[str]]): A list of lists of image URLs.
+            image_urls (dict[str, list[str]]): Image URLs keyed by listing URL.
 
         Returns:
-            list[int]: A list of integers representing scores for each listing.
+            dict[str, dict]: Score, reasoning and latency in seconds keyed by listing URL.
+                Listings that fail to score are left out.
         """
-        # Prepare the system prompt
-        system_prompt = f"""
-        Your task is to score an Airbnb listing based on how well the images of the listing match the user's criteria.
-
-        User's criteria:
-        {criteria}
-
-        You will be provided the images. Output only your score as an integer from 1 to 5, 5 being the highest.
-        """.strip()
+        semaphore = asyncio.Semaphore(self._max_image_scoring_calls)
+
+        async def score_listing(listing_url: str, listing_images: list[str]):
+            try:
+                # Send a few small, distinct photos instead of every image on the page
+                listing_images = await preprocessor.prepare(listing_images)
+                async with semaphore:
+                    start_time = time.perf_counter()
+                    image_output = await score_listing_images(self._openai_client, criteria, listing_images)
+                    latency = time.perf_counter() - start_time
+            except Exception as e:
+                print(f"Error scoring images of {listing_url}: {e}, skipping this one...")
+                return listing_url, None
+            print(f"Scored images of {listing_url} in {latency:.2f}s")
+            self._run_context.publish("image_scored", url=listing_url, score=image_output.score)
+            return listing_url, {
+                'score': image_output.score,
+                'reasoning': image_output.reasoning,
+                'latency': latency,
+            }
 
-        image_outputs = []
-
-        # Iterate through each listing's image URLs
-        for listing_images in image_urls:
-            messages = [
-                {"role": "system", "content": system_prompt},
-            ]
-
-            # Add each image URL to the messages
-            for image_url in listing_images:
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": "",
-                        "type": "image_url",
-                        "image_url": {"url": image_url},
-                    }
-                )
-
-            # Call the OpenAI API
-            response = await self._openai_client.beta.chat.completions.parse(
-                model=MODEL_NAME,
-                messages=messages,
-                response_format=ImageOutput,
+        async with ImagePreprocessor() as preprocessor:
+            results = await asyncio.gather(
+                *(score_listing(listing_url, listing_images) for listing_url, listing_images in image_urls.items())
             )
-
-            # Extract the score and append to the list
-            image_output = response.choices[0].message.parsed
-            image_outputs.append(image_output)
-
-        return image_outputs
+        return {listing_url: result for listing_url, result in results if result is not None}
 
     async def ainput(self, prompt: str) -> str:
         """
@@ -1,6 +1,8 @@
 import asyncio
-from typing import Tuple, Dict
-from config import MODEL_NAME, MAX_LISTING_COUNT
+import json
+import re
+from typing import Tuple, Dict, Optional
+from config import MODEL_NAME, MAX_LISTING_COUNT, MAX_SEARCH_PAGES
 from autogen_core.base import CancellationToken
 from autogen_core.components import default_subscription
 # from autogen_core import MessageContext, TopicId
@@ -14,74 +16,150 @@ from autogen_magentic_one.utils import message_content_to_str
 from autogen_magentic_one.agents.base_worker import BaseWorker
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from openai import AsyncOpenAI
-from playwright.async_api import async_playwright
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.llm_cache import CachedAsyncOpenAI
+from utils.browser_pool import get_browser_pool
+from utils.page_loading import SEARCH_RESULTS_PAGE
+from utils.listing_cache import canonical_listing_id
+from utils.run_context import RunContext
+from utils.search_cache import get_search_cache
+from agents.parsing_agent import normalize_filters
 
 
 async def get_dynamic_html(url):
     try:
-        async with async_playwright() as p:
-            # Launch the browser
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-gpu",
-                    "--disable-accelerated-2d-canvas",
-                    "--no-zygote",
-                    "--single-process",  # Required for some Docker environments
-                    "--disable-web-security",
-                ],
-            )
-            page = await browser.new_page()
-            # Go to the page
-            await page.goto(url)
-            # Wait for the page to load completely
-            await page.wait_for_load_state('networkidle')
-            # Get the final HTML after JavaScript execution
-            html_content = await page.content()
-
-            await browser.close()
-            return html_content
+        # Borrow a page from the shared browser pool and wait for the first search results
+        return await get_browser_pool().fetch_html(url, SEARCH_RESULTS_PAGE)
 
     except Exception as e:
         print(f"Error fetching page: {repr(e)}")
         return f"Error fetching page: {e}"
 
 
+# Airbnb embeds the cursors of the results pages in the search page's state
+PAGE_CURSORS_PATTERN = re.compile(r'"pageCursors"\s*:\s*(\[[^\]]*\])')
+NEXT_PAGE_CURSOR_PATTERN = re.compile(r'"nextPageCursor"\s*:\s*"([^"]+)"')
+
+
+def parse_search_page(html_content: str) -> tuple[list[str], list[str]]:
+    """
+    Find the listing links and the cursors of further results pages on a search page.
+
+    :param html_content: Rendered search results page
+    :return: Listing URLs in the order they are shown, and cursors of other results pages
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Listing cards link to their room more than once, so keep the first link per room
+    base_url = "https://www.airbnb.com"  # Base URL for constructing full links
+    listings = {}
+    for a_tag in soup.find_all('a', href=True, recursive=True):
+        href = a_tag['href']
+        if "/rooms/" in href:  # Airbnb listing URLs usually contain '/rooms/'
+            full_url = urljoin(base_url, href)  # Construct full URL
+            listings.setdefault(canonical_listing_id(full_url), full_url)
+
+    cursors = []
+    match = PAGE_CURSORS_PATTERN.search(html_content)
+    if match:
+        try:
+            # The first cursor is always the first page, which is fetched without one
+            cursors.extend(cursor for cursor in json.loads(match.group(1))[1:] if isinstance(cursor, str))
+        except json.JSONDecodeError:
+            pass
+    if match := NEXT_PAGE_CURSOR_PATTERN.search(html_content):
+        cursors.append(match.group(1))
+    # The pagination links carry the same cursors when the page state can't be found
+    for a_tag in soup.select('nav a[href*="cursor="]'):
+        cursor = dict(parse_qsl(urlsplit(a_tag['href']).query)).get("cursor")
+        if cursor:
+            cursors.append(cursor)
+
+    return list(listings.values()), list(dict.fromkeys(cursors))
+
+
+def with_cursor(url: str, cursor: str) -> str:
+    """
+    Build the URL of the results page at `cursor` of the search at `url`.
+    """
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key not in ("cursor", "pagination_search")]
+    query += [("pagination_search", "true"), ("cursor", cursor)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+async def fetch_search_page(url: str) -> tuple[list[str], list[str]]:
+    html_content = await get_dynamic_html(url)
+    return await asyncio.to_thread(parse_search_page, html_content)
+
+
 # Function to extract Airbnb listing links
-async def extract_airbnb_listing_links(url):
+async def extract_airbnb_listing_links(url, limit: int = MAX_LISTING_COUNT, max_pages: int = MAX_SEARCH_PAGES) -> list[str]:
+    """
+    Collect listing links from the results pages of a search, in rank order.
+
+    The first page tells which further pages exist, and those are then loaded together on the
+    browser pool. Pages are merged in rank order as they arrive, and loading stops as soon as
+    `limit` unique rooms have been found.
+
+    :param url: URL of the first results page
+    :param limit: Number of unique listings to return
+    :param max_pages: Number of results pages to load at most
+    :return: Up to `limit` listing URLs, one per room
+    """
     try:
-        # Step 1: Fetch HTML content from the Airbnb page
-        html_content = await get_dynamic_html(url)
-        
-        # Step 2: Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Step 3: Find all `<a>` tags and filter for listing links
-        base_url = "https://www.airbnb.com"  # Base URL for constructing full links
-        listings = set()
-        for a_tag in soup.find_all('a', href=True, recursive=True):
-            href = a_tag['href']
-            if "/rooms/" in href:  # Airbnb listing URLs usually contain '/rooms/'
-                full_url = urljoin(base_url, href)  # Construct full URL
-                listings.add(full_url)
-        
-
-        # Step 4: Format and output the result
-        formatted_list = [
-            f"{i + 1}. {url}" for i, url in enumerate(listings)
-        ][:MAX_LISTING_COUNT]
-        return "\n\n".join(formatted_list)
+        links, pending = await fetch_search_page(url)
+        listings = {}
+        merge_listing_links(listings, links)
+
+        pages_fetched = 1
+        seen_cursors = set(pending)
+        while pending and pages_fetched < max_pages and len(listings) < limit:
+            batch = pending[:max_pages - pages_fetched]
+            pending = pending[len(batch):]
+            pages_fetched += len(batch)
+            # Pages beyond the first may know of cursors the first one didn't show
+            for _, cursors in await crawl_search_pages(url, batch, listings, limit):
+                for cursor in cursors:
+                    if cursor not in seen_cursors:
+                        seen_cursors.add(cursor)
+                        pending.append(cursor)
+
+        return list(listings.values())[:limit]
     except requests.exceptions.RequestException as e:
         print(f"Error fetching page: {repr(e)}")
-        return f"Error fetching page: {e}"
+        return []
     except Exception as e:
         print(f"Error processing HTML: {repr(e)}")
-        return f"Error processing HTML: {e}"
+        return []
+
+
+async def crawl_search_pages(url: str, cursors: list[str], listings: dict[str, str], limit: int) -> list[tuple[list[str], list[str]]]:
+    """
+    Load results pages concurrently and merge their listings into `listings` in page order.
+
+    :return: The pages merged before `limit` listings were reached; the rest are cancelled
+    """
+    tasks = [asyncio.create_task(fetch_search_page(with_cursor(url, cursor))) for cursor in cursors]
+    pages = []
+    try:
+        # Later pages keep loading while an earlier one is awaited
+        for task in tasks:
+            page = await task
+            pages.append(page)
+            merge_listing_links(listings, page[0])
+            if len(listings) >= limit:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return pages
+
+
+def merge_listing_links(listings: dict[str, str], links: list[str]) -> None:
+    for link in links:
+        listings.setdefault(canonical_listing_id(link), link)
 
 @default_subscription
 class ListingFetchAgent(BaseWorker):
@@ -91,9 +169,11 @@ class ListingFetchAgent(BaseWorker):
         self,
         description: str = DEFAULT_DESCRIPTION,
         client=None,  # Optional client for extended functionality
+        run_context: Optional[RunContext] = None,
     ) -> None:
         super().__init__(description)
-        self._openai_client = AsyncOpenAI()
+        self._openai_client = CachedAsyncOpenAI("ListingFetchAgent")
+        self._run_context = run_context or RunContext()
 
     async def _generate_reply(self, cancellation_token: CancellationToken) -> Tuple[bool, UserContent]:
         """
@@ -120,10 +200,29 @@ class ListingFetchAgent(BaseWorker):
 
             # """
             # Prepare context from chat history
-            context = " ".join([str(msg.content) for msg in self._chat_history[-5:]])
-            extracted_url = await self._parse_context(context)
-            listing_urls = await extract_airbnb_listing_links(extracted_url)
-            response = f"Here are the listing urls:\n\n{listing_urls}"
+            if self._run_context.has("start_url"):
+                extracted_url = self._run_context.start_url
+            else:
+                context = " ".join([str(msg.content) for msg in self._chat_history[-5:]])
+                extracted_url = await self._parse_context(context)
+
+            # Repeated searches with the same filters skip rendering the search page
+            if self._run_context.has("parsed_fields"):
+                search_key = normalize_filters(self._run_context.parsed_fields)
+            else:
+                search_key = extracted_url
+            search_cache = get_search_cache()
+            listing_urls = search_cache.get(search_key)
+            if listing_urls is None:
+                listing_urls = await extract_airbnb_listing_links(extracted_url)
+                if not listing_urls:
+                    return False, "Error fetching listings: no listing urls found"
+                search_cache.put(search_key, listing_urls)
+
+            self._run_context.listing_urls = listing_urls
+            self._run_context.publish("listing_urls", count=len(listing_urls), urls=listing_urls)
+            formatted_list = [f"{i + 1}. {url}" for i, url in enumerate(listing_urls)]
+            response = "Here are the listing urls:\n\n" + "\n\n".join(formatted_list)
             return False, response
 
 
@@ -142,6 +241,7 @@ class ListingFetchAgent(BaseWorker):
         # Call the OpenAI API
         response = await self._openai_client.chat.completions.create(
             model=MODEL_NAME,
+            call_site="parse_context",
             messages=[{"role": "user", "content": prompt}],
         )
 
@@ -13,12 +13,13 @@ from autogen_magentic_one.messages import (
 from autogen_magentic_one.utils import message_content_to_str
 from autogen_magentic_one.agents.base_worker import BaseWorker
 from pydantic import BaseModel
-from openai import AsyncOpenAI
+from utils.llm_cache import CachedAsyncOpenAI
 from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+from utils.run_context import RunContext
 
 class ParsingInput(BaseModel):
     criteria: str
@@ -38,6 +39,32 @@ class ParsingOutput(BaseModel):
     bathrooms: Optional[int]
     amenities: Optional[list[str]]
 
+# Fields that end up in the search URL built by ParsingAgent._format_url
+SEARCH_FILTER_FIELDS = [
+    "location", "checkIn", "checkOut",
+    "guestsAdults", "guestsChildren", "guestsInfants", "guestsPets",
+    "priceMin", "priceMax", "bedrooms", "bathrooms",
+]
+
+def normalize_filters(data: dict) -> tuple:
+    """
+    Reduce parsed search fields to a hashable tuple that is equal for searches producing the same
+    search page, e.g. ignoring case and spacing of the location, number formatting and amenity order.
+    """
+    filters = []
+    for field in SEARCH_FILTER_FIELDS:
+        value = data.get(field, None)
+        if not value:
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+            if value.replace(".", "", 1).isdigit():
+                value = int(float(value))
+        filters.append((field, value))
+    if data.get("amenities", None):
+        filters.append(("amenities", tuple(sorted({amenity.lower() for amenity in data["amenities"]}))))
+    return tuple(filters)
+
 @default_subscription
 class ParsingAgent(BaseWorker):
     DEFAULT_DESCRIPTION = "An agent that parses the user's preferences into a formatted dictionary to construct the URL for the start page for the search."
@@ -46,9 +73,11 @@ class ParsingAgent(BaseWorker):
         self,
         description: str = DEFAULT_DESCRIPTION,
         client = None,  # Optional model client
+        run_context: Optional[RunContext] = None,
     ) -> None:
         super().__init__(description)
-        self._openai_client = AsyncOpenAI()
+        self._openai_client = CachedAsyncOpenAI("ParsingAgent")
+        self._run_context = run_context or RunContext()
     
     async def _generate_reply(self, cancellation_token: CancellationToken) -> Tuple[bool, UserContent]:
         """
@@ -58,11 +87,19 @@ class ParsingAgent(BaseWorker):
         :return: Tuple of (request_halt, response)
         """
         try:
-            context = " ".join([str(msg.content) for msg in self._chat_history[-5:]])
-            criteria = await self._parse_context(context)
+            if self._run_context.has("criteria"):
+                criteria = self._run_context.criteria
+            else:
+                context = " ".join([str(msg.content) for msg in self._chat_history[-5:]])
+                criteria = await self._parse_context(context)
             fields_dict = await self._extract_fields(criteria)
             start_url = self._format_url(fields_dict)
 
+            self._run_context.criteria = criteria
+            self._run_context.parsed_fields = fields_dict
+            self._run_context.start_url = start_url
+            self._run_context.publish("start_url", url=start_url)
+
             # Nicely format the response
             response = "Here are the parsing outputs:\n\n"
             response += f"User's preferences: {criteria}\n"
@@ -84,6 +121,7 @@ class ParsingAgent(BaseWorker):
 
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="parse_context",
             messages=[{"role": "user", "content": prompt}],
             response_format=ParsingInput,
         )
@@ -115,6 +153,7 @@ class ParsingAgent(BaseWorker):
         """.strip()
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="extract_fields",
             messages=[{"role": "user", "content": prompt}],
             response_format=ParsingOutput,
         )
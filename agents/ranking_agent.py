@@ -1,6 +1,6 @@
 import asyncio
-from typing import Tuple
-from config import MODEL_NAME, DESCRIPTION_WEIGHT, IMAGE_WEIGHT, TEMPERATURE, DATABASE, SHOWN_LISTING_COUNT
+from typing import Tuple, Optional, Callable
+from config import MODEL_NAME, TEMPERATURE, SHOWN_LISTING_COUNT
 from autogen_core.base import CancellationToken
 from autogen_core.components import default_subscription
 # from autogen_core import MessageContext, TopicId
@@ -12,19 +12,12 @@ from autogen_magentic_one.messages import (
 )
 from autogen_magentic_one.utils import message_content_to_str
 from autogen_magentic_one.agents.base_worker import BaseWorker
-from itertools import zip_longest
 from pydantic import BaseModel
-from openai import AsyncOpenAI
-import json
-import uuid
-import sqlite3
-from flask import g
-
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-    return db
+from utils.llm_cache import CachedAsyncOpenAI
+from utils.run_context import RunContext
+from utils.result_store import get_result_store
+from utils.ranking import ScoreTable, price_range
+from utils.listing_cache import canonical_listing_id
 
 class RankingInput(BaseModel):
     criteria: str
@@ -40,10 +33,18 @@ class RankingAgent(BaseWorker):
         self,
         description: str = DEFAULT_DESCRIPTION,
         client = None,  # Optional model client
+        run_context: Optional[RunContext] = None,
+        shown_listing_count: int = SHOWN_LISTING_COUNT,
+        on_summary: Optional[Callable[[int, dict], None]] = None,  # Called with (rank, output) as each explanation finishes
+        weights: Optional[dict] = None,  # Ranking signal weights, RANKING_WEIGHTS for any not given
     ) -> None:
         super().__init__(description)
         # self._client = client
-        self._openai_client = AsyncOpenAI()
+        self._openai_client = CachedAsyncOpenAI("RankingAgent")
+        self._run_context = run_context or RunContext()
+        self._shown_listing_count = shown_listing_count
+        self._on_summary = on_summary
+        self._weights = weights
     
     async def _generate_reply(self, cancellation_token: CancellationToken) -> Tuple[bool, UserContent]:
         """
@@ -64,34 +65,27 @@ class RankingAgent(BaseWorker):
                 criteria,
                 description_agent_result,
                 image_agent_result,
+                listing_facts,
                 final_result_id,
             ) = await self._parse_context(context)
 
-            listing_urls = list(set(list(description_agent_result.keys()) + list(image_agent_result.keys())))
-            listings = []
-            description_scores = []
-            description_reasonings = []
-            image_scores = []
-            image_reasonings = []
-            for url in listing_urls:
-                if url in description_agent_result and url in image_agent_result:
-                    listings.append(url)
-                    description_scores.append(description_agent_result[url]['score'])
-                    description_reasonings.append(description_agent_result[url]['reasoning'])
-                    image_scores.append(image_agent_result[url]['score'])
-                    image_reasonings.append(image_agent_result[url]['reasoning'])
-
-            # Rank listings
-            ranked_listings_idxs = self._rank_listings(description_scores, image_scores)
-            sorted_listings = [listings[idx] for idx in ranked_listings_idxs if idx < len(listings)]
-            sorted_desc_reasonings = [description_reasonings[idx] for idx in ranked_listings_idxs if idx < len(listings)]
-            sorted_img_reasonings = [image_reasonings[idx] for idx in ranked_listings_idxs if idx < len(listings)]
+            # Rank listings, only the ones that will be shown get an explanation
+            score_table = ScoreTable.from_results(
+                description_agent_result,
+                image_agent_result,
+                listing_facts,
+                price_range(self._run_context.parsed_fields),
+            )
+            ranked = score_table.rank(self._shown_listing_count, self._weights)
+            sorted_listings = [entry['url'] for entry in ranked]
+            sorted_desc_reasonings = [description_agent_result[url]['reasoning'] for url in sorted_listings]
+            image_results_by_id = {canonical_listing_id(url): result for url, result in image_agent_result.items()}
+            sorted_img_reasonings = [image_results_by_id[entry['listing_id']]['reasoning'] for entry in ranked]
+            self._run_context.publish("ranking", listing_urls=sorted_listings, scores=ranked)
             ranking_output = await self._summarize_reasonings(criteria, sorted_listings, sorted_desc_reasonings, sorted_img_reasonings)
-            ranking_output = ranking_output[:SHOWN_LISTING_COUNT]
 
-            db = get_db()
-            db.execute("INSERT INTO my_table (id, data) VALUES (?, ?)", (final_result_id, json.dumps(ranking_output)))
-            db.commit()
+            get_result_store().save_ranking(final_result_id, ranking_output)
+            self._run_context.publish("sorted_listings", sorted_listings=ranking_output)
 
             response = f"I have sent the sorted listings to the user. The request is satisfied."
             return False, response
@@ -100,6 +94,27 @@ class RankingAgent(BaseWorker):
             return False, f"Error: {repr(e)}"
     
     async def _parse_context(self, context: str):
+        if self._run_context.has("criteria", "description_result_id", "image_result_id", "final_result_id"):
+            criteria = self._run_context.criteria
+            description_agent_result_id = self._run_context.description_result_id
+            image_agent_result_id = self._run_context.image_result_id
+            final_result_id = self._run_context.final_result_id
+        else:
+            (
+                criteria,
+                description_agent_result_id,
+                image_agent_result_id,
+                final_result_id,
+            ) = await self._extract_context(context)
+
+        result_store = get_result_store()
+        description_agent_result = result_store.get_description_scores(description_agent_result_id)
+        image_agent_result = result_store.get_image_scores(image_agent_result_id)
+        browsing_agent_result_id = self._run_context.browsing_result_id or description_agent_result_id
+        listing_facts = {entry['url']: entry['facts'] for entry in result_store.get_summaries(browsing_agent_result_id)}
+        return criteria, description_agent_result, image_agent_result, listing_facts, final_result_id
+
+    async def _extract_context(self, context: str):
         # Prepare the system prompt
         prompt = f"""
         Your task is to parse the chat history and extract a dictionary with four fields:  
@@ -116,6 +131,7 @@ class RankingAgent(BaseWorker):
         # Call the OpenAI API
         response = await self._openai_client.beta.chat.completions.parse(
             model=MODEL_NAME,
+            call_site="parse_context",
             messages=[{"role": "user", "content": prompt}],
             response_format=RankingInput,
         )
@@ -124,24 +140,8 @@ class RankingAgent(BaseWorker):
         description_agent_result_id = ranking_input.description_agent_result_id
         image_agent_result_id = ranking_input.image_agent_result_id
         final_result_id = ranking_input.final_result_id
-        
-        db = get_db()
-        cur = db.execute("SELECT id, data FROM my_table WHERE id = ?", (description_agent_result_id,))
-        row = cur.fetchone()
-        description_agent_result = json.loads(row[1])
-        cur = db.execute("SELECT id, data FROM my_table WHERE id = ?", (image_agent_result_id,))
-        row = cur.fetchone()
-        image_agent_result = json.loads(row[1])
-        return criteria, description_agent_result, image_agent_result, final_result_id
+        return criteria, description_agent_result_id, image_agent_result_id, final_result_id
     
-    def _rank_listings(self, description_scores: list[int], image_scores: list[int]) -> list[int]:
-        scores = [
-            DESCRIPTION_WEIGHT * description_score + IMAGE_WEIGHT * image_score 
-            for description_score, image_score in zip_longest(description_scores, image_scores, fillvalue=0)
-        ]
-        sorted_listing_idxs = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
-        return sorted_listing_idxs
-
     async def _summarize_reasonings(self, criteria: str, listings: list[str], desc_analyses: list[str], img_analyses: list[str]) -> list:
         prompt_template = """
         User's preferences in looking for an Airbnb: {criteria}
@@ -153,8 +153,7 @@ class RankingAgent(BaseWorker):
         Given the above information, generate a brief summary for why this Airbnb is a good match for the user.
         """.strip()
 
-        ranking_outputs = []
-        for listing, desc_analysis, img_analysis in zip(listings, desc_analyses, img_analyses):
+        async def summarize(rank: int, listing: str, desc_analysis: str, img_analysis: str) -> dict:
             prompt = prompt_template.format(
                 criteria=criteria, 
                 description=desc_analysis, 
@@ -162,14 +161,25 @@ class RankingAgent(BaseWorker):
             )
             response = await self._openai_client.chat.completions.create(
                 model=MODEL_NAME,
+                call_site="reasoning_summary",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=TEMPERATURE
             )
-            ranking_outputs.append({
+            ranking_output = {
                 'url': listing,
                 'summary': response.choices[0].message.content.strip()
-            })
-        return ranking_outputs
+            }
+            self._run_context.publish("listing_ranked", rank=rank, **ranking_output)
+            if self._on_summary:
+                self._on_summary(rank, ranking_output)
+            return ranking_output
+
+        # Explanations are independent, so write them all at once and keep the ranked order
+        ranking_outputs = await asyncio.gather(*(
+            summarize(rank, listing, desc_analysis, img_analysis)
+            for rank, (listing, desc_analysis, img_analysis) in enumerate(zip(listings, desc_analyses, img_analyses), start=1)
+        ))
+        return list(ranking_outputs)
 
     async def ainput(self, prompt: str) -> str:
         """
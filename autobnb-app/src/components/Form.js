@@ -194,14 +194,13 @@ const Form = () => {
       });
 
       if (!response.ok) {
-        throw new Error("Search request failed");
+        throw new Error(response.status === 429 ? "Too many searches in progress, please try again shortly" : "Search request failed");
       }
 
-      const data = await response.json();
-      // const data = {"sorted_listings": ["https://airbnb.com/s/San-Diego", "https://airbnb.com/s/San-Francisco", "https://airbnb.com/s/San-Diego", "https://airbnb.com/s/San-Francisco", "https://airbnb.com/s/San-Diego", "https://airbnb.com/s/San-Francisco"]}
-      if (Array.isArray(data.sorted_listings)) {
-        // Navigate to results page with the URLs
-        navigate('/results', { state: { data: data.sorted_listings } });
+      const { job_id, subscription } = await response.json();
+      // Results follow the search's progress events and fill in as listings are processed
+      if (job_id) {
+        navigate('/results', { state: { jobId: job_id, subscription } });
       } else {
         setError("Invalid response format from server");
       }
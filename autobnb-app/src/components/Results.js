@@ -6,17 +6,113 @@ import ArrowBackIcon from '@mui/icons-material/ArrowBack';
 import ChevronLeftIcon from '@mui/icons-material/ChevronLeft';
 import ChevronRightIcon from '@mui/icons-material/ChevronRight';
 
+// Cards arriving within this many milliseconds share one preview request
+const PREVIEW_BATCH_DELAY = 300;
+
+// Last previews and ETag of each batch of cards, so showing the same results again is
+// answered with a 304 instead of the photo lists
+const previewBatches = new Map();
+
 const Results = () => {
   const location = useLocation();
   const navigate = useNavigate();
+  const jobId = location.state && location.state.jobId;
+  const subscription = location.state && location.state.subscription;
+  const [listings, setListings] = useState((location.state && location.state.data) || []);
+  const [isRanked, setIsRanked] = useState(!jobId);
+  const [progress, setProgress] = useState(jobId ? "Starting search" : null);
+  const [error, setError] = useState(null);
+  const [previews, setPreviews] = useState({});
+  const requestedPreviewsRef = useRef(new Set());
+
+  // Show listings as the agents summarize them, then swap in the final ranking
+  useEffect(() => {
+    if (!jobId) return;
+    const query = subscription ? `?subscription=${encodeURIComponent(subscription)}` : '';
+    const events = new EventSource(`/api/search/${jobId}/events${query}`);
+
+    events.addEventListener('start_url', () => setProgress("Searching Airbnb"));
+    events.addEventListener('listing_urls', (e) => {
+      const { count } = JSON.parse(e.data);
+      setProgress(`Found ${count} listings, reading them`);
+    });
+    events.addEventListener('listing_summarized', (e) => {
+      const listing = JSON.parse(e.data);
+      setListings((prev) => (prev.some((l) => l.url === listing.url) ? prev : [...prev, listing]));
+    });
+    events.addEventListener('ranking', () => setProgress("Ranking the best matches"));
+    events.addEventListener('sorted_listings', (e) => {
+      setListings(JSON.parse(e.data).sorted_listings);
+      setIsRanked(true);
+      setProgress(null);
+    });
+    events.addEventListener('status', (e) => {
+      const { status, error } = JSON.parse(e.data);
+      if (status === 'failed' || status === 'cancelled') {
+        setError(error || `Search ${status}`);
+        setProgress(null);
+      }
+      if (status !== 'queued' && status !== 'running') {
+        events.close();
+      }
+    });
+    events.onerror = () => {
+      if (events.readyState === EventSource.CLOSED) {
+        setError("Lost connection to the search");
+        setProgress(null);
+      }
+    };
+
+    // The stream is opened with the search's subscription, so once it stays closed after
+    // leaving the page the server gives the search up; a quick remount just reconnects
+    return () => events.close();
+  }, [jobId, subscription]);
+
+  // Fetch the photos of every new card in one batch instead of one request per card
+  useEffect(() => {
+    const urls = listings.map((listing) => listing.url).filter((url) => !requestedPreviewsRef.current.has(url));
+    if (urls.length === 0) return;
+
+    const timer = setTimeout(async () => {
+      urls.forEach((url) => requestedPreviewsRef.current.add(url));
+      const batchKey = [...urls].sort().join('\n');
+      const cached = previewBatches.get(batchKey);
+      try {
+        const response = await fetch('http://127.0.0.1:5001/api/previews', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            ...(cached ? { 'If-None-Match': cached.etag } : {}),
+          },
+          body: JSON.stringify({ urls }),
+        });
+        if (response.status === 304 && cached) {
+          setPreviews((prev) => ({ ...prev, ...cached.previews }));
+          return;
+        }
+        if (!response.ok) {
+          throw new Error('Preview request failed');
+        }
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (etag) {
+          previewBatches.set(batchKey, { etag, previews: data.previews });
+        }
+        setPreviews((prev) => ({ ...prev, ...data.previews }));
+      } catch (error) {
+        console.error('Error fetching images:', error);
+        setPreviews((prev) => ({ ...prev, ...Object.fromEntries(urls.map((url) => [url, []])) }));
+      }
+    }, PREVIEW_BATCH_DELAY);
+
+    return () => clearTimeout(timer);
+  }, [listings]);
 
   // Check if we have data in the location state
-  if (!location.state || !location.state.data) {
+  if (!jobId && !(location.state && location.state.data)) {
     return <Navigate to="/" replace />;
   }
 
-  const listings = location.state.data;
-
   return (
     <Box sx={{ 
       width: '100%', 
@@ -38,10 +134,18 @@ const Results = () => {
 
       {/* Main Content */}
       <Container maxWidth="xl" sx={{ pt: 10, pb: 4 }}>
+        {(progress || error) && (
+          <Box sx={{ display: 'flex', alignItems: 'center', gap: 2, mb: 3 }}>
+            {progress && <CircularProgress size={20} sx={{ color: '#FF5A5F' }} />}
+            <Typography variant="body1" sx={{ color: error ? 'error.main' : 'text.secondary' }}>
+              {error || progress}
+            </Typography>
+          </Box>
+        )}
         <Grid container spacing={3}>
           {listings.map((listing, index) => (
             <Grid item xs={12} md={6} key={listing.url}>
-              <ListingCell url={listing.url} rank={index + 1} summary={listing.summary} />
+              <ListingCell url={listing.url} rank={isRanked ? index + 1 : null} summary={listing.summary} images={previews[listing.url]} />
             </Grid>
           ))}
         </Grid>
@@ -50,52 +154,22 @@ const Results = () => {
   );
 };
 
-const ListingCell = ({ url, rank, summary }) => {
-  const [isLoading, setIsLoading] = useState(true);
-  const [hasError, setHasError] = useState(false);
+const ListingCell = ({ url, rank, summary, images = null }) => {
   const [currentImageIndex, setCurrentImageIndex] = useState(0);
-  const [images, setImages] = useState([]);
-  const fetchedRef = useRef(false);
-
-  useEffect(() => {
-    const loadImages = async () => {
-      if (fetchedRef.current) return;
-      fetchedRef.current = true;
-      
-      try {
-        setIsLoading(true);
-        const response = await fetch(`http://127.0.0.1:5001/preview/${encodeURIComponent(url)}`);
-        if (response.ok) {
-          const imageUrls = await response.json();
-          if (imageUrls && imageUrls.length > 0) {
-            setImages(imageUrls);
-          } else {
-            setHasError(true);
-          }
-        } else {
-          setHasError(true);
-        }
-      } catch (error) {
-        console.error('Error fetching images:', error);
-        setHasError(true);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    loadImages();
-  }, [url]);
+  const isLoading = images === null;
+  const photos = images || [];
+  const hasError = !isLoading && photos.length === 0;
 
   const handlePrevImage = (e) => {
     e.preventDefault();
     e.stopPropagation();
-    setCurrentImageIndex((prev) => (prev > 0 ? prev - 1 : images.length - 1));
+    setCurrentImageIndex((prev) => (prev > 0 ? prev - 1 : photos.length - 1));
   };
 
   const handleNextImage = (e) => {
     e.preventDefault();
     e.stopPropagation();
-    setCurrentImageIndex((prev) => (prev < images.length - 1 ? prev + 1 : 0));
+    setCurrentImageIndex((prev) => (prev < photos.length - 1 ? prev + 1 : 0));
   };
 
   return (
@@ -110,24 +184,26 @@ const ListingCell = ({ url, rank, summary }) => {
       }}
     >
       {/* Rank Badge */}
-      <Box
-        sx={{
-          position: 'absolute',
-          top: 10,
-          left: 10,
-          zIndex: 2,
-          display: 'flex',
-          alignItems: 'center',
-          bgcolor: 'rgba(255, 255, 255, 0.9)',
-          borderRadius: '12px',
-          padding: '4px 8px',
-          boxShadow: 2,
-        }}
-      >
-        <Typography variant="body2" sx={{ fontWeight: 'bold' }}>
-          #{rank}
-        </Typography>
-      </Box>
+      {rank && (
+        <Box
+          sx={{
+            position: 'absolute',
+            top: 10,
+            left: 10,
+            zIndex: 2,
+            display: 'flex',
+            alignItems: 'center',
+            bgcolor: 'rgba(255, 255, 255, 0.9)',
+            borderRadius: '12px',
+            padding: '4px 8px',
+            boxShadow: 2,
+          }}
+        >
+          <Typography variant="body2" sx={{ fontWeight: 'bold' }}>
+            #{rank}
+          </Typography>
+        </Box>
+      )}
 
       {/* Image Container */}
       <Box
@@ -162,7 +238,7 @@ const ListingCell = ({ url, rank, summary }) => {
         )}
 
         {/* Images */}
-        {images.map((imageUrl, index) => (
+        {photos.map((imageUrl, index) => (
           <Box
             key={imageUrl}
             component="img"
@@ -182,12 +258,12 @@ const ListingCell = ({ url, rank, summary }) => {
         ))}
 
         {/* Fallback Icon */}
-        {!isLoading && (hasError || images.length === 0) && (
+        {!isLoading && hasError && (
           <HomeIcon sx={{ fontSize: 48, color: '#bbb' }} />
         )}
 
         {/* Navigation Arrows */}
-        {images.length > 1 && (
+        {photos.length > 1 && (
           <>
             <IconButton
               onClick={handlePrevImage}
@@ -234,7 +310,7 @@ const ListingCell = ({ url, rank, summary }) => {
                 zIndex: 2,
               }}
             >
-              {images.map((_, index) => (
+              {photos.map((_, index) => (
                 <Box
                   key={index}
                   sx={{
@@ -5,9 +5,23 @@ TEMPERATURE = 0.9
 # Worker settings
 MAX_WORKERS = 5
 
+# Concurrency limits for scraping listings on a single event loop
+MAX_PAGE_FETCHES = MAX_WORKERS
+MAX_LLM_CALLS = 10
+MAX_IMAGE_SCORING_CALLS = 5
+
 # Max listings to search for
 MAX_LISTING_COUNT = 10
 SHOWN_LISTING_COUNT = 6
+# Search results pages crawled at most to find MAX_LISTING_COUNT unique listings
+MAX_SEARCH_PAGES = 5
+
+# Score each listing as soon as it is summarized instead of waiting for the whole browsing stage
+STREAMING_PIPELINE = False
+
+# How the agents are driven: "orchestrator" lets the LedgerOrchestrator plan each turn,
+# "deterministic" runs them along a fixed pipeline without any planning LLM calls
+PIPELINE_MODE = "orchestrator"
 
 # Flask port
 FLASK_PORT = 5001
@@ -15,6 +29,112 @@ FLASK_PORT = 5001
 # Weights for ranking
 DESCRIPTION_WEIGHT = 0.8
 IMAGE_WEIGHT = 1 - DESCRIPTION_WEIGHT
+# Every ranking signal is scaled to [0, 1]; a listing missing one gets RANKING_MISSING_SIGNAL for it
+RANKING_WEIGHTS = {
+    "description": DESCRIPTION_WEIGHT,
+    "image": IMAGE_WEIGHT,
+    "price_fit": 0.2,
+    "rating": 0.1,
+    "review_count": 0.05,
+    "distance": 0.05,
+}
+RANKING_MISSING_SIGNAL = 0.5  # Neutral, so missing data never ranks above a good listing
+DISTANCE_SCALE_KM = 5  # Distance from the middle of the results at which closeness halves
 
 # Database stuff
-DATABASE = 'database.db'
\ No newline at end of file
+DATABASE = 'database.db'
+DATABASE_POOL_SIZE = 8
+DATABASE_BUSY_TIMEOUT = 5000  # Milliseconds to wait for another writer's lock
+
+# Retention of stored run results
+RUN_RETENTION_TTL = 7 * 24 * 60 * 60  # Seconds
+RUN_RETENTION_MAX_BYTES = 200 * 1024 * 1024
+RETENTION_INTERVAL = 60 * 60  # Seconds between retention and compaction passes
+RUN_ARCHIVE_DIR = None  # Directory for gzipped JSON lines of removed runs, e.g. './archive'
+VACUUM_FREE_RATIO = 0.25  # Vacuum once this fraction of the database file is free pages
+
+# Browser pool settings
+BROWSER_POOL_SIZE = 2
+MAX_CONCURRENT_PAGES = 8
+MAX_PAGES_PER_BROWSER = 100
+BROWSER_HEALTH_CHECK_INTERVAL = 30
+
+# Page loading: pages are read once their content is there, or as they are at the deadline
+SEARCH_PAGE_TIMEOUT = 30000  # Milliseconds
+LISTING_PAGE_TIMEOUT = 30000
+PREVIEW_PAGE_TIMEOUT = 20000
+# Requests not needed to read text and URLs off a page
+BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+BLOCKED_REQUEST_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "bat.bing.com",
+    "sentry.io",
+]
+
+
+# Scraped listing cache
+LISTING_CACHE_TTL = 6 * 60 * 60  # seconds
+LISTING_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# LLM response cache
+LLM_CACHE_MAX_ENTRIES = 1000  # in-memory LRU tier
+LLM_CACHE_MAX_DISK_ENTRIES = 20000  # SQLite tier
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+# Whether each call site's responses are cached. Unlisted call sites are never cached.
+LLM_CACHE_POLICY = {
+    "summary": True,  # Independent of the user's criteria
+    "extract_fields": True,
+    "score_description": True,
+    "score_descriptions": True,
+    "score_images": True,
+    "reasoning_summary": True,
+    "parse_context": False,
+    "generate_query": False,  # Meant to be creative on every call
+}
+
+# Search result page cache
+SEARCH_CACHE_TTL = 10 * 60  # seconds
+SEARCH_CACHE_MAX_ENTRIES = 500
+
+# Image preprocessing before vision scoring
+MAX_IMAGES_PER_LISTING = 6
+IMAGE_TARGET_SIZE = 512  # Longest side in pixels
+MIN_IMAGE_SIZE = 150  # Smaller images are icons and avatars
+IMAGE_HASH_DISTANCE = 6  # Max differing hash bits for two images to count as duplicates
+MAX_IMAGE_DOWNLOADS = 16
+IMAGE_DOWNLOAD_WIDTH = 720  # Width of the CDN variant downloaded instead of the original
+
+# Drop listings whose scraped facts break the parsed search filters before summarizing them
+HARD_FILTERS = False
+HARD_FILTER_PRICE_TOLERANCE = 0.1  # Fraction a nightly price may exceed the maximum by
+
+# Token budget for the listing text sent to the summarizer
+SUMMARY_TOKEN_BUDGET = 3000
+
+# Background search jobs
+MAX_CONCURRENT_SEARCHES = 2
+MAX_QUEUED_SEARCHES = 10
+SEARCH_JOB_RETENTION = 60 * 60  # Seconds a finished job's result is kept
+SEARCH_DEDUP_WINDOW = 5 * 60  # Seconds a completed search is handed to identical searches
+SEARCH_DISCONNECT_GRACE = 30  # Seconds a subscriber's event stream may be gone before its search is cancelled
+
+# Warm agent runtimes kept ready for searches
+AGENT_RUNTIME_POOL_SIZE = MAX_CONCURRENT_SEARCHES
+MAX_RUNS_PER_RUNTIME = 50
+
+# Result card previews
+PREVIEW_IMAGE_COUNT = 5
+PREVIEW_CACHE_TTL = 60 * 60  # Seconds a rendered preview is reused
+PREVIEW_CACHE_MAX_ENTRIES = 1000
+
+# Embedding pre-filter: only the listings closest to the criteria are scored by the LLM and by
+# vision. Not applied with STREAMING_PIPELINE, which scores each listing before all are summarized.
+EMBEDDING_PREFILTER = False
+EMBEDDING_PROVIDER = "openai"  # "openai", or "hashing" for a local deterministic embedder
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_PREFILTER_TOP_M = 20
+EMBEDDING_CACHE_MAX_ENTRIES = 10000
@@ -3,37 +3,39 @@ import logging
 import os
 import argparse
 import json
-import hashlib
 
-from autogen_core import SingleThreadedAgentRuntime
 from autogen_core.application.logging import EVENT_LOGGER_NAME
 from autogen_core.base import AgentId, AgentProxy, Subscription
 from autogen_core.models._types import UserMessage
 from autogen_magentic_one.agents.multimodal_web_surfer import MultimodalWebSurfer
-from autogen_magentic_one.agents.orchestrator import LedgerOrchestrator
 from autogen_magentic_one.agents.user_proxy import UserProxy
 from autogen_magentic_one.messages import BroadcastMessage, RequestReplyMessage
-from autogen_magentic_one.utils import LogHandler, create_completion_client_from_env
+from autogen_magentic_one.utils import LogHandler
 from openai import OpenAI
-from agents.init_agent import InitAgent
-from agents.browsing_agent import BrowsingAgent
-from agents.listing_fetch_agent import ListingFetchAgent
-from agents.image_analysis_agent import ImageAnalysisAgent
-from agents.ranking_agent import RankingAgent
-from agents.description_agent import DescriptionAgent
-from agents.parsing_agent import ParsingAgent
-from config import MODEL_NAME, MAX_LISTING_COUNT, FLASK_PORT, DATABASE
+from pipeline import DeterministicPipeline
+from runtime_pool import WarmRuntime, get_agent_runtime_pool
+from utils.run_context import RunContext, normalize_user_prefs
+from config import MODEL_NAME, SHOWN_LISTING_COUNT, FLASK_PORT, STREAMING_PIPELINE, PIPELINE_MODE
 
 from flask import Flask, request, jsonify, send_file, Response, send_from_directory
 from flask_cors import CORS
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
-import sqlite3
-from flask import g
+from utils.listing_cache import get_listing_cache, canonical_listing_id
+from utils.llm_cache import get_llm_cache
+from utils.search_cache import get_search_cache
+from utils.jobs import JobManager, QueueFullError
+from utils.events import EventStreamLogHandler
+from utils.result_store import get_result_store
+from utils.retention import get_retention_manager
+from utils.previews import get_preview_service, previews_etag
+from utils.browser_pool import get_browser_pool
+from utils.embeddings import get_embedding_cache
+from utils.ranking import ScoreTable, price_range
 import uuid
 
 app = Flask(__name__, static_folder="static/build", static_url_path="")
-cors = CORS(app)
+# Results.js reads the previews ETag to send it back with If-None-Match
+cors = CORS(app, expose_headers=['ETag'])
+job_manager = JobManager()
 
 @app.route("/")
 def serve():
@@ -46,81 +48,66 @@ def serve_static(path):
     else:
         return send_from_directory(app.static_folder, "index.html")
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-    return db
-
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
-
 def init_db():
-    with app.app_context():
-        db = get_db()
-        with app.open_resource('schema.sql', mode='r') as f:
-            db.executescript(f.read())
+    result_store = get_result_store()
+    with app.open_resource('schema.sql', mode='r') as f:
+        result_store.init_schema(f.read())
+    migrated = result_store.migrate_legacy_results()
+    if migrated:
+        print(f"Migrated {migrated} legacy results out of my_table")
+    interrupted = result_store.interrupt_unfinished_runs()
+    if interrupted:
+        print(f"Marked {interrupted} unfinished runs as interrupted")
 
 @app.route('/preview/<path:url>')
 def get_preview(url):
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    "--no-sandbox",
-                    "--disable-setuid-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-gpu",
-                    "--disable-accelerated-2d-canvas",
-                    "--no-zygote",
-                    "--single-process",  # Required for some Docker environments
-                    "--disable-web-security",
-                ],
-            )
-            context = browser.new_context()
-            page = context.new_page()
-
-            page.goto(url, timeout=20000)
-            content = page.content()
-            soup = BeautifulSoup(content, 'html.parser')
-
-            image_urls = []
-
-            # Extract images from <picture> tags
-            for picture in soup.find_all('picture', recursive=True):
-                if len(image_urls) < 5:
-                    img = picture.find('img')
-                    if img and (src := img.get('src')) and not src.endswith(('.gif', '.svg')):
-                        image_urls.append(src)
-
-            # Extract preloaded images
-            if len(image_urls) < 5:
-                for link in soup.find_all('link', {'rel': 'preload', 'as': 'image'}):
-                    if (href := link.get('href')) and not href.endswith(('.gif', '.svg')):
-                        image_urls.append(href)
-                        if len(image_urls) >= 5:
-                            break
-
-            # Extract meta images
-            if len(image_urls) < 5:
-                meta_images = soup.find_all('meta', {'property': 'og:image'}) or soup.find_all('meta', {'itemprop': 'image'})
-                for meta in meta_images:
-                    if (content := meta.get('content')) and not content.endswith(('.gif', '.svg')):
-                        image_urls.append(content)
-                        if len(image_urls) >= 5:
-                            break
-
-            browser.close()
-            return jsonify(image_urls)
-
+        return jsonify(get_preview_service().get_previews([url])[url])
     except Exception as e:
         print(f"Error fetching preview: {str(e)}")
         return jsonify([]), 500
 
+@app.route('/api/previews', methods=['POST'])
+def get_previews():
+    urls = (request.json or {}).get('urls') or []
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'urls must be a list of listing URLs'}), 400
+
+    try:
+        preview_service = get_preview_service()
+        previews, missing = preview_service.lookup(urls)
+        # The validator comes from what is already stored, so a client holding these previews
+        # gets its 304 without any page being rendered
+        etag = previews_etag(previews)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            if missing:
+                previews.update(preview_service.render(missing))
+                etag = previews_etag(previews)
+            response = Response(json.dumps({'previews': previews}, sort_keys=True), mimetype='application/json')
+    except Exception as e:
+        print(f"Error fetching previews: {str(e)}")
+        return jsonify({'error': 'Failed to fetch previews'}), 500
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=300'
+    return response
+
+@app.route('/api/stats')
+def get_stats():
+    return jsonify({
+        'listing_cache': get_listing_cache().stats(),
+        'llm_cache': get_llm_cache().stats(),
+        'search_cache': get_search_cache().stats(),
+        'agent_runtimes': get_agent_runtime_pool().stats(),
+        'search_jobs': job_manager.stats(),
+        'retention': get_retention_manager().stats(),
+        'previews': get_preview_service().stats(),
+        'browser_pool': get_browser_pool().stats(),
+        'embeddings': get_embedding_cache().stats(),
+    })
+
 @app.route('/api/search', methods=['POST'])
 def search():
     data = request.json
@@ -132,15 +119,94 @@ def search():
     del user_prefs['key']
 
     result_id = str(uuid.uuid4())
-    asyncio.run(main(user_prefs, result_id, './logs', False, True))
+    pipeline_mode = app.config.get('PIPELINE_MODE', PIPELINE_MODE)
+    run_context = RunContext.from_user_prefs(user_prefs, result_id)
+    # Identical searches share one pipeline run
+    dedup_key = f"{pipeline_mode}:{normalize_user_prefs(user_prefs)}"
+
+    async def run_search(job):
+        await main(user_prefs, result_id, './logs', False, True, pipeline_mode, run_context=run_context)
+
+        sorted_listings = get_result_store().get_ranking(result_id)
+        if sorted_listings is None:
+            raise RuntimeError("The search finished without ranking any listings")
+        print(json.dumps(sorted_listings, indent=2))
+        return sorted_listings
 
-    db = get_db()
-    cur = db.execute("SELECT id, data FROM my_table WHERE id = ?", (result_id,))
-    row = cur.fetchone()
-    sorted_listings = json.loads(row[1])
-    print(json.dumps(sorted_listings, indent=2))
+    try:
+        job, subscription = job_manager.submit(run_search, job_id=result_id, run_context=run_context, dedup_key=dedup_key)
+    except QueueFullError as e:
+        return jsonify({'error': f"Too many searches in progress: {e}"}), 429
+
+    return jsonify({'job_id': job.id, 'subscription': subscription}), 202
+
+@app.route('/api/search/<job_id>', methods=['GET'])
+def get_search(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Search not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/search/<job_id>/events')
+def search_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Search not found'}), 404
+
+    # Browsers resend the last event ID they saw when the connection drops
+    last_event_id = request.headers.get('Last-Event-ID', '0')
+    after = int(last_event_id) if last_event_id.isdigit() else 0
+    # A subscriber whose streams all stay closed has left, so its search is cancelled
+    subscription = request.args.get('subscription')
+
+    def stream():
+        job_manager.connect(job, subscription)
+        try:
+            for event in job.events.listen(after=after):
+                yield event.to_sse() if event else ": keep-alive\n\n"
+        finally:
+            job_manager.disconnect(job, subscription)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/search/<job_id>', methods=['DELETE'])
+def cancel_search(job_id):
+    subscription = request.args.get('subscription')
+    if not subscription:
+        return jsonify({'error': 'Missing subscription'}), 400
+    job = job_manager.cancel(job_id, subscription)
+    if job is None:
+        return jsonify({'error': 'Search not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/search/<job_id>/rerank', methods=['POST'])
+def rerank_search(job_id):
+    # Ranks the stored scores again with other weights, no LLM calls; explained listings keep their summary
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Search not found'}), 404
+    data = request.json or {}
+
+    result_store = get_result_store()
+    listing_facts = {entry['url']: entry['facts'] for entry in result_store.get_summaries(job_id)}
+    score_table = ScoreTable.from_results(
+        result_store.get_description_scores(job_id),
+        result_store.get_image_scores(job_id),
+        listing_facts,
+        price_range(job.run_context.parsed_fields if job.run_context else None),
+    )
+    try:
+        ranked = score_table.rank(int(data.get('count', SHOWN_LISTING_COUNT)), data.get('weights'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
 
-    return jsonify({'sorted_listings': sorted_listings})
+    summaries = {canonical_listing_id(entry['url']): entry['summary'] for entry in result_store.get_ranking(job_id) or []}
+    for entry in ranked:
+        entry['summary'] = summaries.get(entry['listing_id'])
+    return jsonify({'sorted_listings': ranked})
 
 @app.route('/api/generate_query', methods=['POST'])
 def generate_query():
@@ -173,55 +239,77 @@ def generate_query():
     query = response.choices[0].message.content.strip()
     return jsonify({'example_query': query})
 
-async def main(user_prefs, result_id, logs_dir: str, hil_mode: bool, save_screenshots: bool) -> None:
-    runtime = SingleThreadedAgentRuntime()
-
-    client = create_completion_client_from_env(model=MODEL_NAME)
-
-    await ParsingAgent.register(runtime, "ParsingAgent", ParsingAgent)
-    parsing_agent = AgentProxy(AgentId("ParsingAgent", "default"), runtime)
+async def main(user_prefs, result_id, logs_dir: str, hil_mode: bool, save_screenshots: bool, pipeline_mode: str = PIPELINE_MODE, run_context: RunContext = None) -> None:
+    # Shared typed state so agents don't need an LLM call to find each other's outputs
+    run_context = run_context or RunContext.from_user_prefs(user_prefs, result_id)
 
-    await ListingFetchAgent.register(runtime, "ListingFetchAgent", ListingFetchAgent)
-    listing_fetch = AgentProxy(AgentId("ListingFetchAgent", "default"), runtime)
+    async def run(warm_runtime: WarmRuntime) -> None:
+        async with warm_runtime.session(run_context):
+            await run_agents(warm_runtime, user_prefs, result_id, pipeline_mode)
 
-    await BrowsingAgent.register(runtime, "BrowsingAgent", BrowsingAgent)
-    browsing_agent = AgentProxy(AgentId("BrowsingAgent", "default"), runtime)
-
-    await DescriptionAgent.register(runtime, "DescriptionAgent", DescriptionAgent)
-    description_agent = AgentProxy(AgentId("DescriptionAgent", "default"), runtime)
-
-    await ImageAnalysisAgent.register(runtime, "ImageAnalysisAgent", ImageAnalysisAgent)
-    image_analysis = AgentProxy(AgentId("ImageAnalysisAgent", "default"), runtime)
-
-    await RankingAgent.register(runtime, "RankingAgent", RankingAgent)
-    ranking_agent = AgentProxy(AgentId("RankingAgent", "default"), runtime)
-
-    await InitAgent.register(runtime, "InitAgent", InitAgent)
-    init_agent = AgentProxy(AgentId("InitAgent", "default"), runtime)
+    result_store = get_result_store()
+    result_store.create_run(result_id, run_context.criteria)
+    try:
+        # Agents are registered and their clients built once per runtime, not per search
+        await get_agent_runtime_pool().run(run)
+    except asyncio.CancelledError:
+        result_store.finish_run(result_id, "cancelled")
+        raise
+    except Exception:
+        result_store.finish_run(result_id, "failed")
+        raise
+    result_store.finish_run(result_id, "completed")
+
+async def run_agents(warm_runtime: WarmRuntime, user_prefs, result_id, pipeline_mode: str) -> None:
+    runtime = warm_runtime.runtime
+    parsing_agent = warm_runtime.agent_proxy("ParsingAgent")
+    listing_fetch = warm_runtime.agent_proxy("ListingFetchAgent")
+    browsing_agent = warm_runtime.agent_proxy("BrowsingAgent")
+    description_agent = warm_runtime.agent_proxy("DescriptionAgent")
+    image_analysis = warm_runtime.agent_proxy("ImageAnalysisAgent")
+    ranking_agent = warm_runtime.agent_proxy("RankingAgent")
+    init_agent = warm_runtime.agent_proxy("InitAgent")
+
+    if pipeline_mode == "deterministic":
+        instructions = f"""
+    Find the best possible Airbnb listings for the user preferences provided.
 
-    await LedgerOrchestrator.register(
-        runtime, 
-        "orchestrator", 
-        lambda: LedgerOrchestrator(
-            agents=[parsing_agent, listing_fetch, browsing_agent, description_agent, image_analysis, ranking_agent],
-            model_client=client,
-            max_stalls_before_replan=MAX_LISTING_COUNT,
-        )
-    )
-    orchestrator = AgentProxy(AgentId("orchestrator", "default"), runtime)
+    User Preferences: {user_prefs}
 
-    runtime.start()
+    Final Result ID: {result_id}
+        """.strip()
 
-    instructions = f"""
-    Given the user preferences provided, use the agents at your disposal to look in these listings for the best possible matches. Agents can access the chat history to see the outputs of other agents, so there is no need for the orchestrator to repeat details of agent outputs to other agents.
+        await DeterministicPipeline(runtime).run(instructions)
+        return
 
-    Call each of the following agents exactly once in this order:
+    if STREAMING_PIPELINE:
+        # The Browsing Agent scores descriptions and images itself as each listing is summarized
+        agents = [parsing_agent, listing_fetch, browsing_agent, ranking_agent]
+        agent_order = """
+    1. Parsing Agent
+    2. Listing Fetch Agent
+    3. Browsing Agent
+    4. Ranking Agent
+        """.strip()
+    else:
+        agents = [parsing_agent, listing_fetch, browsing_agent, description_agent, image_analysis, ranking_agent]
+        agent_order = """
     1. Parsing Agent
     2. Listing Fetch Agent
     3. Browsing Agent
     4. Description Agent
     5. Image Analysis Agent
     6. Ranking Agent
+        """.strip()
+
+    # One orchestrator per runtime, reset at the start of every run
+    orchestrator = await warm_runtime.orchestrator(agents)
+
+    instructions = f"""
+    Given the user preferences provided, use the agents at your disposal to look in these listings for the best possible matches. Agents can access the chat history to see the outputs of other agents, so there is no need for the orchestrator to repeat details of agent outputs to other agents.
+
+    Call each of the following agents exactly once in this order:
+    {agent_order}
 
     When calling the browser agent you do not need to tell it which links to visit. The request is not satisfied until the Ranking Agent has been called. The request is satisfied immediately after the Ranking Agent is called.
 
@@ -239,7 +327,6 @@ async def main(user_prefs, result_id, logs_dir: str, hil_mode: bool, save_screen
         recipient=orchestrator.id,
         sender=init_agent.id,
     )
-    await runtime.stop_when_idle()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run MagenticOne example with log directory.")
@@ -260,7 +347,16 @@ if __name__ == "__main__":
         help="The start page for the web surfer",
     )
 
+    parser.add_argument(
+        "--pipeline_mode",
+        type=str,
+        choices=["orchestrator", "deterministic"],
+        default=PIPELINE_MODE,
+        help=f"How the agents are driven (default: {PIPELINE_MODE})",
+    )
+
     args = parser.parse_args()
+    app.config['PIPELINE_MODE'] = args.pipeline_mode
 
     if not os.path.exists(args.logs_dir):
         os.makedirs(args.logs_dir)
@@ -268,9 +364,12 @@ if __name__ == "__main__":
     logger = logging.getLogger(EVENT_LOGGER_NAME)
     logger.setLevel(logging.INFO)
     log_handler = LogHandler(filename=os.path.join(args.logs_dir, "log.jsonl"))
-    logger.handlers = [log_handler]
+    # Orchestration events also go to the progress stream of the search that logged them
+    logger.handlers = [log_handler, EventStreamLogHandler()]
 
     init_db()
+    get_retention_manager().start()
+    get_agent_runtime_pool().start()
     port = FLASK_PORT
     print(f"Flask server running on http://localhost:{port}")
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
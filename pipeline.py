@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from typing import Tuple
+
+from autogen_core.application.logging import EVENT_LOGGER_NAME
+from autogen_core.base import AgentId, CancellationToken
+from autogen_core.models._types import UserMessage
+from autogen_magentic_one.agents.base_worker import BaseWorker
+from autogen_magentic_one.messages import OrchestrationEvent
+from config import STREAMING_PIPELINE
+
+# Stages of the fixed pipeline. Agents within a stage run in parallel.
+PIPELINE_STAGES = [
+    ["ParsingAgent"],
+    ["ListingFetchAgent"],
+    ["BrowsingAgent"],
+    ["DescriptionAgent", "ImageAnalysisAgent"],
+    ["RankingAgent"],
+]
+
+# In streaming mode the Browsing Agent already scores descriptions and images
+STREAMING_PIPELINE_STAGES = [
+    ["ParsingAgent"],
+    ["ListingFetchAgent"],
+    ["BrowsingAgent"],
+    ["RankingAgent"],
+]
+
+
+class DeterministicPipeline:
+    """
+    Runs the agents along a fixed DAG instead of letting the LedgerOrchestrator plan each turn.
+
+    Every stage sees the shared chat history built from the instructions and the replies of the
+    previous stages, exactly as it would after the orchestrator's broadcasts, but no ledger LLM
+    calls are made between stages.
+    """
+
+    def __init__(self, runtime, streaming: bool = STREAMING_PIPELINE) -> None:
+        self._runtime = runtime
+        self._stages = STREAMING_PIPELINE_STAGES if streaming else PIPELINE_STAGES
+        self._chat_history = []
+        self._logger = logging.getLogger(EVENT_LOGGER_NAME)
+
+    async def run(self, instructions: str, cancellation_token: CancellationToken | None = None) -> None:
+        """
+        Run every stage in order.
+
+        :param instructions: The user request, including preferences and the final result ID
+        :param cancellation_token: Token to check for cancellation
+        """
+        cancellation_token = cancellation_token or CancellationToken()
+        self._chat_history = [UserMessage(content=instructions, source="User")]
+
+        for stage in self._stages:
+            # Every agent in a stage starts from the same history; replies are appended in stage order
+            history = list(self._chat_history)
+            replies = await asyncio.gather(
+                *(self._call_agent(agent_type, history, cancellation_token) for agent_type in stage)
+            )
+            for agent_type, (_, response) in zip(stage, replies):
+                self._chat_history.append(UserMessage(content=response, source=agent_type))
+                if isinstance(response, str) and response.startswith("Error"):
+                    raise RuntimeError(f"{agent_type} failed: {response}")
+
+    async def _call_agent(
+        self,
+        agent_type: str,
+        history: list,
+        cancellation_token: CancellationToken,
+    ) -> Tuple[bool, str]:
+        agent = await self._runtime.try_get_underlying_agent_instance(AgentId(agent_type, "default"), BaseWorker)
+        agent._chat_history = list(history)
+        request_halt, response = await agent._generate_reply(cancellation_token)
+        self._logger.info(OrchestrationEvent(f"{agent_type} (deterministic)", str(response)))
+        return request_halt, response
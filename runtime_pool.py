@@ -0,0 +1,300 @@
+import asyncio
+import atexit
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from autogen_core import SingleThreadedAgentRuntime
+from autogen_core.base import AgentId, AgentProxy
+from autogen_magentic_one.agents.base_worker import BaseWorker
+from autogen_magentic_one.agents.orchestrator import LedgerOrchestrator
+from autogen_magentic_one.messages import ResetMessage
+from autogen_magentic_one.utils import create_completion_client_from_env
+from agents.init_agent import InitAgent
+from agents.browsing_agent import BrowsingAgent
+from agents.listing_fetch_agent import ListingFetchAgent
+from agents.image_analysis_agent import ImageAnalysisAgent
+from agents.ranking_agent import RankingAgent
+from agents.description_agent import DescriptionAgent
+from agents.parsing_agent import ParsingAgent
+from utils.run_context import RunContext
+from config import MODEL_NAME, MAX_LISTING_COUNT, AGENT_RUNTIME_POOL_SIZE, MAX_RUNS_PER_RUNTIME
+
+# Worker agents registered on every runtime. Each gets its RunContext when a run starts.
+WORKER_AGENTS = {
+    "ParsingAgent": ParsingAgent,
+    "ListingFetchAgent": ListingFetchAgent,
+    "BrowsingAgent": BrowsingAgent,
+    "DescriptionAgent": DescriptionAgent,
+    "ImageAnalysisAgent": ImageAnalysisAgent,
+    "RankingAgent": RankingAgent,
+}
+ORCHESTRATOR_TYPE = "Orchestrator"
+
+
+class WarmRuntime:
+    """
+    An agent runtime with every agent registered and instantiated ahead of time.
+
+    The runtime, its agents and their OpenAI clients are bound to the event loop that created
+    them, so each one lives on its own event loop in a background thread and runs one search
+    at a time. Starting a run only resets the agents' chat history and hands them the run's
+    RunContext.
+    """
+
+    def __init__(self, api_key: str | None) -> None:
+        self.api_key = api_key
+        self.runtime = None
+        self.completion_client = None
+        self.runs = 0
+        self._agents: dict[str, BaseWorker] = {}
+        self._orchestrator_registered = False
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="agent-runtime", daemon=True)
+        self._thread.start()
+
+    def start(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def close(self) -> None:
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=30)
+        except Exception as e:
+            print(f"Error closing agent runtime: {repr(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def run(self, fn):
+        """
+        Run `fn(self)` on this runtime's event loop from any other event loop.
+
+        The coroutine is scheduled with a copy of the caller's context, so context variables
+        such as the search's event stream stay visible to the agents.
+        """
+        future = asyncio.run_coroutine_threadsafe(fn(self), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def agent_proxy(self, agent_type: str) -> AgentProxy:
+        return AgentProxy(AgentId(agent_type, "default"), self.runtime)
+
+    async def orchestrator(self, agents: list[AgentProxy]) -> AgentProxy:
+        """
+        The runtime's orchestrator, registered on the first orchestrated run.
+
+        The orchestrator subscribes to the default topic, where the workers broadcast their
+        replies, so one registered per run would keep reacting to every later run. Instead each
+        runtime has a single one, reset at the start of every session.
+
+        :param agents: Agents the orchestrator directs; the same for every run of a process
+        """
+        if not self._orchestrator_registered:
+            await LedgerOrchestrator.register(
+                self.runtime,
+                ORCHESTRATOR_TYPE,
+                lambda: LedgerOrchestrator(
+                    agents=agents,
+                    model_client=self.completion_client,
+                    max_stalls_before_replan=MAX_LISTING_COUNT,
+                ),
+            )
+            self._orchestrator_registered = True
+        return self.agent_proxy(ORCHESTRATOR_TYPE)
+
+    @asynccontextmanager
+    async def session(self, run_context: RunContext):
+        """
+        Prepare the agents for one run and process messages until the run is idle.
+
+        :param run_context: Shared state of the run handed to every agent
+        """
+        for agent in self._agents.values():
+            agent._chat_history = []
+            agent._run_context = run_context
+        self.runtime.start()
+        try:
+            if self._orchestrator_registered:
+                # Drop the previous run's task, plan and ledger
+                await self.runtime.send_message(ResetMessage(), AgentId(ORCHESTRATOR_TYPE, "default"))
+            yield self
+        except BaseException:
+            await self.runtime.stop()
+            raise
+        await self.runtime.stop_when_idle()
+
+    # Everything below runs on the runtime's event loop
+
+    async def _start(self) -> None:
+        self.runtime = SingleThreadedAgentRuntime()
+        for agent_type, agent_class in WORKER_AGENTS.items():
+            await agent_class.register(self.runtime, agent_type, lambda agent_class=agent_class: agent_class(run_context=RunContext()))
+        await InitAgent.register(self.runtime, "InitAgent", InitAgent)
+        self.completion_client = create_completion_client_from_env(model=MODEL_NAME)
+
+        # Instantiate the agents now so their clients are built before the first search
+        for agent_type in WORKER_AGENTS:
+            self._agents[agent_type] = await self.runtime.try_get_underlying_agent_instance(
+                AgentId(agent_type, "default"), BaseWorker
+            )
+        await self.runtime.try_get_underlying_agent_instance(AgentId("InitAgent", "default"), BaseWorker)
+
+    async def _close(self) -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class AgentRuntimePool:
+    """
+    Keeps warm agent runtimes ready so a search only pays for its own work.
+
+    Runtimes are checked out for one search at a time. A runtime is retired after a run that
+    failed or was cancelled, after `max_runs` runs, or when the OpenAI API key has changed,
+    and a replacement is warmed up in the background.
+    """
+
+    def __init__(self, size: int = AGENT_RUNTIME_POOL_SIZE, max_runs: int = MAX_RUNS_PER_RUNTIME) -> None:
+        self._size = size
+        self._max_runs = max_runs
+        self._idle: list[WarmRuntime] = []
+        self._lock = threading.Lock()
+        self.warm_starts = 0
+        self.cold_starts = 0
+        self.retired = 0
+        self._warm_setup_seconds = 0.0
+        self._cold_setup_seconds = 0.0
+
+    def start(self) -> None:
+        """
+        Warm up the pool. Runtimes need an API key for their clients, so without one in the
+        environment they are built on first use instead.
+        """
+        if os.environ.get("OPENAI_API_KEY"):
+            for _ in range(self._size):
+                self._replenish()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for warm_runtime in idle:
+            warm_runtime.close()
+
+    async def run(self, fn):
+        """
+        Run `fn(warm_runtime)` on a checked-out runtime.
+
+        :param fn: Coroutine function taking a WarmRuntime
+        :return: Whatever `fn` returns
+        """
+        start_time = time.perf_counter()
+        warm_runtime, warm = await asyncio.to_thread(self._checkout)
+        healthy = False
+
+        async def timed(warm_runtime: WarmRuntime):
+            self._record_setup(time.perf_counter() - start_time, warm)
+            return await fn(warm_runtime)
+
+        try:
+            result = await warm_runtime.run(timed)
+            healthy = True
+            return result
+        finally:
+            self._checkin(warm_runtime, healthy)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "warm_starts": self.warm_starts,
+                "cold_starts": self.cold_starts,
+                "retired": self.retired,
+                "avg_warm_setup_seconds": self._warm_setup_seconds / self.warm_starts if self.warm_starts else 0.0,
+                "avg_cold_setup_seconds": self._cold_setup_seconds / self.cold_starts if self.cold_starts else 0.0,
+            }
+
+    def _checkout(self) -> tuple[WarmRuntime, bool]:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        stale = []
+        warm_runtime = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if candidate.api_key == api_key:
+                    warm_runtime = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            self._retire(candidate)
+        if warm_runtime is not None:
+            return warm_runtime, True
+        return self._build(api_key), False
+
+    def _checkin(self, warm_runtime: WarmRuntime, healthy: bool) -> None:
+        warm_runtime.runs += 1
+        reusable = (
+            healthy
+            and warm_runtime.runs < self._max_runs
+            and warm_runtime.api_key == os.environ.get("OPENAI_API_KEY")
+        )
+        with self._lock:
+            if reusable and len(self._idle) < self._size:
+                self._idle.append(warm_runtime)
+                return
+            replenish = len(self._idle) < self._size
+        self._retire(warm_runtime)
+        if replenish:
+            # Keep a warm replacement ready for the next search
+            threading.Thread(target=self._replenish, daemon=True).start()
+
+    def _build(self, api_key: str | None) -> WarmRuntime:
+        warm_runtime = WarmRuntime(api_key)
+        try:
+            warm_runtime.start()
+        except BaseException:
+            warm_runtime.close()
+            raise
+        return warm_runtime
+
+    def _replenish(self) -> None:
+        try:
+            warm_runtime = self._build(os.environ.get("OPENAI_API_KEY"))
+        except Exception as e:
+            print(f"Error warming up agent runtime: {repr(e)}")
+            return
+        with self._lock:
+            if len(self._idle) < self._size:
+                self._idle.append(warm_runtime)
+                return
+        warm_runtime.close()
+
+    def _retire(self, warm_runtime: WarmRuntime) -> None:
+        with self._lock:
+            self.retired += 1
+        threading.Thread(target=warm_runtime.close, daemon=True).start()
+
+    def _record_setup(self, seconds: float, warm: bool) -> None:
+        with self._lock:
+            if warm:
+                self.warm_starts += 1
+                self._warm_setup_seconds += seconds
+            else:
+                self.cold_starts += 1
+                self._cold_setup_seconds += seconds
+        print(f"Agent runtime ready in {seconds:.3f}s ({'warm' if warm else 'cold'} start)")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_agent_runtime_pool() -> AgentRuntimePool:
+    """
+    Return the process-wide agent runtime pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AgentRuntimePool()
+            atexit.register(_pool.close)
+        return _pool
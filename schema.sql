@@ -1,7 +1,71 @@
 -- schema.sql
-DROP TABLE IF EXISTS my_table;
+-- Tables are created only if missing so stored runs survive restarts; old runs are removed by
+-- the retention job instead. my_table, which held results as JSON blobs before the normalized
+-- tables, is migrated and dropped once by ResultStore.migrate_legacy_results.
 
-CREATE TABLE my_table (
+-- One row per search. The run ID is also the result ID the agents pass to each other.
+CREATE TABLE IF NOT EXISTS runs (
     id TEXT PRIMARY KEY,
-    data TEXT NOT NULL
+    criteria TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL,
+    ranked_at REAL
 );
+
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+
+-- Listings seen by any run, keyed by canonical listing ID (rooms/<id>)
+CREATE TABLE IF NOT EXISTS listings (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    facts TEXT,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    image_urls TEXT NOT NULL,
+    PRIMARY KEY (run_id, listing_id)
+);
+
+CREATE INDEX IF NOT EXISTS summaries_listing_id ON summaries (listing_id);
+
+CREATE TABLE IF NOT EXISTS description_scores (
+    run_id TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    reasoning TEXT,
+    PRIMARY KEY (run_id, listing_id)
+);
+
+CREATE INDEX IF NOT EXISTS description_scores_listing_id ON description_scores (listing_id);
+
+CREATE TABLE IF NOT EXISTS image_scores (
+    run_id TEXT NOT NULL,
+    listing_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    reasoning TEXT,
+    latency REAL,
+    PRIMARY KEY (run_id, listing_id)
+);
+
+CREATE INDEX IF NOT EXISTS image_scores_listing_id ON image_scores (listing_id);
+
+CREATE TABLE IF NOT EXISTS rankings (
+    run_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    listing_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (run_id, rank)
+);
+
+CREATE INDEX IF NOT EXISTS rankings_listing_id ON rankings (listing_id);
@@ -0,0 +1,39 @@
+import asyncio
+
+from utils.embeddings import EmbeddingCache, EmbeddingPreFilter, HashingEmbeddingProvider
+
+LISTINGS = [
+    {"url": "https://www.airbnb.com/rooms/1", "summary": "Dark basement room next to the highway"},
+    {"url": "https://www.airbnb.com/rooms/2", "summary": "Beachfront villa with a private pool and ocean view"},
+    {"url": "https://www.airbnb.com/rooms/3", "summary": "Office desk in a shared coworking space"},
+    {"url": "https://www.airbnb.com/rooms/4", "summary": "Ocean view apartment steps from the beach"},
+]
+CRITERIA = "beach house with an ocean view and a pool"
+
+
+def _select(listings, top_m):
+    pre_filter = EmbeddingPreFilter(HashingEmbeddingProvider(), EmbeddingCache(), top_m)
+    return asyncio.run(pre_filter.select(CRITERIA, listings))
+
+
+def test_keeps_the_most_similar_listings():
+    selected, similarities = _select(LISTINGS, 2)
+    assert len(similarities) == len(LISTINGS)
+    best = sorted(range(len(LISTINGS)), key=lambda i: -similarities[i])[:2]
+    assert {listing["url"] for listing in selected} == {LISTINGS[i]["url"] for i in best}
+    assert {listing["url"] for listing in selected} == {LISTINGS[1]["url"], LISTINGS[3]["url"]}
+
+
+def test_keeps_the_original_rank_order():
+    # The closest listing comes last in the input, so similarity order would put it first
+    listings = [LISTINGS[0], LISTINGS[3], LISTINGS[2], LISTINGS[1]]
+    selected, _ = _select(listings, 3)
+    positions = [listings.index(listing) for listing in selected]
+    assert positions == sorted(positions)
+    assert LISTINGS[1] in selected
+
+
+def test_passes_everything_through_below_the_cutoff():
+    selected, similarities = _select(LISTINGS, 10)
+    assert selected == LISTINGS
+    assert len(similarities) == len(LISTINGS)
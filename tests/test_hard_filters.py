@@ -0,0 +1,28 @@
+from utils.hard_filters import HardFilter
+
+
+def _facts(amenities, complete=True, price=None):
+    return {"amenities": amenities, "amenities_complete": complete, "price": price, "capacity": {}}
+
+
+def test_amenities_match_whole_titles():
+    hard_filter = HardFilter(amenities=["Dryer", "Pool", "Washer"])
+    assert hard_filter.violations(_facts(["Hair dryer", "Pool table", "Dishwasher"])) == [
+        "has no dryer",
+        "has no pool",
+        "has no washer",
+    ]
+    assert hard_filter.violations(_facts(["Free dryer – In unit", "Private outdoor pool", "Washer"])) == []
+
+
+def test_missing_amenity_is_unknown_in_a_preview_list():
+    hard_filter = HardFilter(amenities=["Pool"])
+    assert hard_filter.violations(_facts(["Wifi", "Kitchen"], complete=False)) == []
+
+
+def test_price_is_only_checked_per_stated_night():
+    hard_filter = HardFilter(price_max=7000)
+    # $7000 may be the whole stay's budget, so only a night over it breaks the filter
+    assert hard_filter.violations(_facts([], price={"amount": 9000, "qualifier": "for 7 nights"})) == []
+    assert hard_filter.violations(_facts([], price={"amount": 8000, "qualifier": "night"})) != []
+    assert hard_filter.violations(_facts([], price={"amount": 9000, "qualifier": None})) == []
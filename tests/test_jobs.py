@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from utils.jobs import JobManager, CANCELLED, RUNNING
+
+
+async def _wait_forever(job):
+    await asyncio.sleep(60)
+
+
+def _wait_for(job, status, timeout=5):
+    deadline = time.time() + timeout
+    while job.status != status and time.time() < deadline:
+        time.sleep(0.01)
+    return job.status
+
+
+def test_shared_job_is_cancelled_only_by_its_last_subscription():
+    manager = JobManager(max_concurrent=1)
+    job, first = manager.submit(_wait_forever, dedup_key="same search")
+    shared, second = manager.submit(_wait_forever, dedup_key="same search")
+    assert shared is job
+    assert _wait_for(job, RUNNING) == RUNNING
+
+    # Repeating one subscriber's cancel doesn't use up the other's subscription
+    manager.cancel(job.id, first)
+    manager.cancel(job.id, first)
+    manager.cancel(job.id, "unknown")
+    assert job.status == RUNNING
+
+    manager.cancel(job.id, second)
+    assert _wait_for(job, CANCELLED) == CANCELLED
+
+
+def test_job_is_cancelled_when_its_subscriber_stays_disconnected():
+    manager = JobManager(max_concurrent=1, disconnect_grace=0.05)
+    job, subscription = manager.submit(_wait_forever)
+    assert _wait_for(job, RUNNING) == RUNNING
+
+    # A reconnect within the grace period keeps the search alive
+    manager.connect(job, subscription)
+    manager.disconnect(job, subscription)
+    manager.connect(job, subscription)
+    time.sleep(0.2)
+    assert job.status == RUNNING
+
+    manager.disconnect(job, subscription)
+    assert _wait_for(job, CANCELLED) == CANCELLED
@@ -0,0 +1,33 @@
+from utils.ranking import ScoreTable
+
+
+def _table(description_scores, image_scores, listing_facts=None):
+    urls = [f"https://www.airbnb.com/rooms/{i}" for i in range(len(description_scores))]
+    return ScoreTable.from_results(
+        {url: {"score": score, "reasoning": ""} for url, score in zip(urls, description_scores)},
+        {url: {"score": score, "reasoning": ""} for url, score in zip(urls, image_scores)},
+        dict(zip(urls, listing_facts or [])),
+    )
+
+
+def test_missing_signals_do_not_beat_a_good_listing():
+    # Averaging only the signals a listing has would rank the listing without facts first
+    table = _table([4, 4], [4, 4], [
+        {"rating": 3.0, "review_count": 50},
+        None,
+    ])
+    assert table.top_k(2) == [0, 1]
+
+
+def test_ties_keep_scored_order():
+    table = _table([3, 5, 3, 3, 5], [3, 5, 3, 3, 5])
+    assert table.top_k(3) == [1, 4, 0]
+    assert table.top_k(10) == [1, 4, 0, 2, 3]
+
+
+def test_ties_at_the_cutoff_keep_scored_order():
+    # Six listings tie for the last two places
+    table = _table([5, 3, 3, 3, 3, 3, 3], [5, 3, 3, 3, 3, 3, 3])
+    assert table.top_k(3) == [0, 1, 2]
+    scores = [2, 4, 2, 2, 5, 2, 2, 4, 2, 2]
+    assert _table(scores, scores).top_k(4) == [4, 1, 7, 0]
@@ -0,0 +1,34 @@
+import json
+import sqlite3
+from pathlib import Path
+
+from utils.result_store import ConnectionPool, ResultStore
+
+SCHEMA = (Path(__file__).parent.parent / "schema.sql").read_text()
+
+
+def _legacy_store(tmp_path, rows):
+    database = str(tmp_path / "results.db")
+    with sqlite3.connect(database) as db:
+        db.execute("CREATE TABLE my_table (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        db.executemany("INSERT INTO my_table (id, data) VALUES (?, ?)", [(key, json.dumps(data)) for key, data in rows.items()])
+    store = ResultStore(ConnectionPool(database, size=1))
+    store.init_schema(SCHEMA)
+    return store
+
+
+def test_legacy_results_are_migrated_once(tmp_path):
+    store = _legacy_store(tmp_path, {
+        "browsing": [{"url": "https://www.airbnb.com/rooms/1", "summary": "Loft", "image_urls": ["a.jpg"]}],
+        "scores": {"https://www.airbnb.com/rooms/1": {"score": 4, "reasoning": "Nice"}},
+        "final": [{"url": "https://www.airbnb.com/rooms/1", "summary": "Close to the beach"}],
+    })
+    # Restarting must keep the legacy rows rather than drop them with the table
+    store.init_schema(SCHEMA)
+
+    assert store.migrate_legacy_results() == 2
+    assert store.get_ranking("final") == [{"url": "https://www.airbnb.com/rooms/1", "summary": "Close to the beach"}]
+    assert store.get_summaries("browsing")[0]["image_urls"] == ["a.jpg"]
+
+    assert store.migrate_legacy_results() == 0
+    assert store.get_ranking("final") == [{"url": "https://www.airbnb.com/rooms/1", "summary": "Close to the beach"}]
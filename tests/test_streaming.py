@@ -0,0 +1,30 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.streaming import StreamingScorer
+
+
+def test_scoring_calls_are_limited():
+    running = {"description": 0, "image": 0}
+    peak = {"description": 0, "image": 0}
+
+    def tracked(kind):
+        async def score(criteria, _):
+            running[kind] += 1
+            peak[kind] = max(peak[kind], running[kind])
+            await asyncio.sleep(0.01)
+            running[kind] -= 1
+            return SimpleNamespace(score=3, reasoning="")
+        return score
+
+    async def crawl():
+        scorer = StreamingScorer(
+            "quiet", tracked("description"), tracked("image"), max_llm_calls=3, max_image_scoring_calls=2,
+        )
+        for i in range(20):
+            scorer.submit({"url": f"https://www.airbnb.com/rooms/{i}", "summary": "", "image_urls": []})
+        return await scorer.drain()
+
+    description_results, image_results = asyncio.run(crawl())
+    assert len(description_results) == len(image_results) == 20
+    assert peak == {"description": 3, "image": 2}
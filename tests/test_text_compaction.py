@@ -0,0 +1,96 @@
+from utils.text_compaction import compact_listing_text, count_tokens
+
+PAGE_WITH_NAV_TABS = """
+Photos
+Amenities
+Reviews
+Location
+Sunny loft in the Marais
+4 guests · 2 bedrooms · 3 beds · 1 bath
+★ 4.9 · 123 reviews
+A bright top-floor loft with exposed beams, a full kitchen and a view over the rooftops of Paris.
+What this place offers
+Wifi
+Kitchen
+★ 4.9 · 123 reviews
+Marie
+October 2024
+Lovely place, very quiet at night and close to everything.
+Tom
+2 weeks ago
+Great host.
+Where you'll be
+Paris, Île-de-France, France
+"""
+
+
+def _sections(compacted: str) -> tuple[list[str], list[str]]:
+    lines = compacted.splitlines()
+    if "Reviews:" not in lines:
+        return lines, []
+    heading = lines.index("Reviews:")
+    return lines[:heading], lines[heading + 1:]
+
+
+def test_nav_tabs_do_not_start_reviews():
+    body, reviews = _sections(compact_listing_text(PAGE_WITH_NAV_TABS))
+
+    assert "4 guests · 2 bedrooms · 3 beds · 1 bath" in body
+    assert any(line.startswith("A bright top-floor loft") for line in body)
+    assert "Lovely place, very quiet at night and close to everything." in reviews
+    assert "Great host." in reviews
+
+
+def test_nav_tabs_are_dropped_and_headings_keep_their_items():
+    body, _ = _sections(compact_listing_text(PAGE_WITH_NAV_TABS))
+
+    for tab in ("Photos", "Amenities", "Reviews", "Location"):
+        assert tab not in body
+    offers = body.index("What this place offers")
+    assert body[offers + 1:offers + 3] == ["Wifi", "Kitchen"]
+    assert body.index("4 guests · 2 bedrooms · 3 beds · 1 bath") < body.index("Sunny loft in the Marais")
+
+
+def test_reviews_end_at_next_section():
+    body, reviews = _sections(compact_listing_text(PAGE_WITH_NAV_TABS))
+
+    assert "Paris, Île-de-France, France" in body
+    assert "Paris, Île-de-France, France" not in reviews
+
+
+def test_rating_next_to_title_is_not_a_reviews_heading():
+    text = "Cabin by the lake\n★ 4.8 · 56 reviews\n2 guests · 1 bedroom\nA quiet cabin with a wood stove."
+
+    body, reviews = _sections(compact_listing_text(text))
+
+    assert reviews == []
+    assert "2 guests · 1 bedroom" in body
+
+
+def test_reviews_from_listing_facts():
+    text = "Title: Cabin by the lake\nPrice: $120 night\nReviews:\n- Cozy and clean.\n- Would stay again, the lake is beautiful."
+
+    body, reviews = _sections(compact_listing_text(text))
+
+    assert "Price: $120 night" in body
+    assert reviews == ["- Would stay again, the lake is beautiful.", "- Cozy and clean."]
+
+
+def test_reviews_are_kept_and_trimmed_whole():
+    text = PAGE_WITH_NAV_TABS.replace("Tom\n2 weeks ago", "Tom\nLyon, France\n2 weeks ago")
+    _, reviews = _sections(compact_listing_text(text))
+    assert reviews == [
+        "Marie",
+        "October 2024",
+        "Lovely place, very quiet at night and close to everything.",
+        "Tom",
+        "Lyon, France",
+        "2 weeks ago",
+        "Great host.",
+    ]
+
+    # One token short of keeping everything: the most detailed review stays whole, the other goes whole
+    body, reviews = _sections(compact_listing_text(text))
+    budget = sum(count_tokens(line) + 1 for line in body + reviews) - 1
+    _, reviews = _sections(compact_listing_text(text, token_budget=budget))
+    assert reviews == ["Marie", "October 2024", "Lovely place, very quiet at night and close to everything."]
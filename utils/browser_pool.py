@@ -0,0 +1,254 @@
+import asyncio
+import atexit
+import threading
+from contextlib import asynccontextmanager
+from config import (
+    BROWSER_POOL_SIZE,
+    MAX_CONCURRENT_PAGES,
+    MAX_PAGES_PER_BROWSER,
+    BROWSER_HEALTH_CHECK_INTERVAL,
+)
+from playwright.async_api import async_playwright
+from utils.page_loading import PageLoadPolicy, PageLoadMetrics, LISTING_PAGE, load_page, should_block
+
+# No --single-process: several pages share each browser, and in single-process mode a page that
+# crashes takes the whole browser down with it
+BROWSER_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-accelerated-2d-canvas",
+    "--no-zygote",
+    "--disable-web-security",
+]
+
+# Idle pages kept open per browser for reuse
+MAX_IDLE_PAGES = 4
+
+
+class PooledBrowser:
+    def __init__(self, browser, context) -> None:
+        self.browser = browser
+        self.context = context
+        self.idle_pages = []
+        self.active_pages = 0
+        self.pages_served = 0
+
+    def is_healthy(self) -> bool:
+        return self.browser.is_connected()
+
+    def is_worn_out(self) -> bool:
+        return self.pages_served >= MAX_PAGES_PER_BROWSER
+
+
+class BrowserPool:
+    """
+    A process-wide pool of warm Chromium browsers.
+
+    Playwright objects are bound to the event loop that created them, so the pool runs
+    its own event loop in a background thread. Callers on any event loop (agents) or on
+    plain threads (Flask routes) borrow pages through `run` / `run_sync`, which schedule
+    the work onto the pool's loop.
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_pages: int = MAX_CONCURRENT_PAGES,
+        health_check_interval: float = BROWSER_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        self._size = size
+        self._max_pages = max_pages
+        self._health_check_interval = health_check_interval
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browsers: list[PooledBrowser] = []
+        self._page_semaphore = None
+        self._browsers_lock = None
+        self._health_task = None
+        self.page_loads = PageLoadMetrics()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+            self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=30)
+            except Exception as e:
+                print(f"Error closing browser pool: {repr(e)}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    async def run(self, fn, *args):
+        """
+        Run `fn(page, *args)` with a borrowed page from any event loop.
+
+        :param fn: Coroutine function taking a Playwright page as its first argument
+        :return: Whatever `fn` returns
+        """
+        future = asyncio.run_coroutine_threadsafe(self._run(fn, *args), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def run_sync(self, fn, *args):
+        """
+        Blocking variant of `run` for synchronous callers such as Flask routes.
+        """
+        return asyncio.run_coroutine_threadsafe(self._run(fn, *args), self._loop).result()
+
+    async def fetch_html(self, url: str, policy: PageLoadPolicy = LISTING_PAGE) -> str:
+        return await self.run(load_page, url, policy, self.page_loads)
+
+    def fetch_html_sync(self, url: str, policy: PageLoadPolicy = LISTING_PAGE) -> str:
+        return self.run_sync(load_page, url, policy, self.page_loads)
+
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self._browsers),
+            "healthy_browsers": sum(1 for b in self._browsers if b.is_healthy()),
+            "active_pages": sum(b.active_pages for b in self._browsers),
+            "idle_pages": sum(len(b.idle_pages) for b in self._browsers),
+            "pages_served": sum(b.pages_served for b in self._browsers),
+            "page_loads": self.page_loads.stats(),
+        }
+
+    # Everything below runs on the pool's event loop
+
+    async def _start(self) -> None:
+        self._playwright = await async_playwright().start()
+        self._page_semaphore = asyncio.Semaphore(self._max_pages)
+        self._browsers_lock = asyncio.Lock()
+        for _ in range(self._size):
+            self._browsers.append(await self._launch_browser())
+        self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def _close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+        for pooled in self._browsers:
+            await self._close_browser(pooled)
+        self._browsers = []
+        if self._playwright:
+            await self._playwright.stop()
+
+    async def _launch_browser(self) -> PooledBrowser:
+        browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+        context = await browser.new_context()
+        # Every page of the pool is only read, so nothing it doesn't need is ever downloaded
+        await context.route("**/*", self._route)
+        return PooledBrowser(browser, context)
+
+    async def _route(self, route) -> None:
+        request = route.request
+        if should_block(request.resource_type, request.url):
+            self.page_loads.record_blocked(request.resource_type)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _close_browser(self, pooled: PooledBrowser) -> None:
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            print(f"Error closing browser: {repr(e)}")
+
+    async def _replace_browser(self, pooled: PooledBrowser) -> None:
+        await self._close_browser(pooled)
+        self._browsers[self._browsers.index(pooled)] = await self._launch_browser()
+
+    async def _health_check(self) -> None:
+        async with self._browsers_lock:
+            for pooled in list(self._browsers):
+                if not pooled.is_healthy():
+                    print("Browser disconnected, relaunching...")
+                    await self._replace_browser(pooled)
+                elif pooled.is_worn_out() and pooled.active_pages == 0:
+                    # Recycle long-lived browsers to keep memory bounded
+                    await self._replace_browser(pooled)
+                else:
+                    pooled.idle_pages = [page for page in pooled.idle_pages if not page.is_closed()]
+
+    async def _health_check_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._health_check_interval)
+            try:
+                await self._health_check()
+            except Exception as e:
+                print(f"Error during browser health check: {repr(e)}")
+
+    async def _pick_browser(self) -> PooledBrowser:
+        async with self._browsers_lock:
+            for pooled in list(self._browsers):
+                if not pooled.is_healthy():
+                    await self._replace_browser(pooled)
+            return min(self._browsers, key=lambda b: (b.is_worn_out(), b.active_pages))
+
+    @asynccontextmanager
+    async def _page(self):
+        async with self._page_semaphore:
+            pooled = await self._pick_browser()
+            page = None
+            while pooled.idle_pages and page is None:
+                candidate = pooled.idle_pages.pop()
+                if not candidate.is_closed():
+                    page = candidate
+            if page is None:
+                page = await pooled.context.new_page()
+
+            pooled.active_pages += 1
+            pooled.pages_served += 1
+            reusable = False
+            try:
+                yield page
+                reusable = True
+            finally:
+                pooled.active_pages -= 1
+                await self._release_page(pooled, page, reusable)
+
+    async def _release_page(self, pooled: PooledBrowser, page, reusable: bool) -> None:
+        if reusable and pooled.is_healthy() and not page.is_closed() and len(pooled.idle_pages) < MAX_IDLE_PAGES:
+            try:
+                await page.goto("about:blank")
+                pooled.idle_pages.append(page)
+                return
+            except Exception:
+                pass
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+
+    async def _run(self, fn, *args):
+        async with self._page() as page:
+            return await fn(page, *args)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Return the process-wide browser pool, starting it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = BrowserPool()
+            pool.start()
+            atexit.register(pool.close)
+            _pool = pool
+        return _pool
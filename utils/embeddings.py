@@ -0,0 +1,201 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+import threading
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from openai import AsyncOpenAI
+from utils.listing_cache import canonical_listing_id
+from config import (
+    EMBEDDING_PROVIDER,
+    EMBEDDING_MODEL,
+    EMBEDDING_PREFILTER_TOP_M,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+)
+
+# Texts sent to the embeddings API per request
+EMBEDDING_BATCH_SIZE = 256
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns texts into vectors. `name` must change whenever the vectors would.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        :param texts: Texts to embed
+        :return: Array with one row per text
+        """
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model: str = EMBEDDING_MODEL) -> None:
+        self.name = f"openai:{model}"
+        self._model = model
+        self._client = AsyncOpenAI()
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        rows = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            response = await self._client.embeddings.create(model=self._model, input=texts[start:start + EMBEDDING_BATCH_SIZE])
+            rows.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return np.asarray(rows, dtype=np.float32)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local, deterministic bag-of-words embedder for tests and offline runs.
+
+    Every word is hashed to one of `dimensions` signed buckets, so texts sharing words get
+    similar vectors without any model or network call.
+    """
+
+    def __init__(self, dimensions: int = 512) -> None:
+        self.name = f"hashing:{dimensions}"
+        self._dimensions = dimensions
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self._dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+                vectors[row, digest % self._dimensions] += 1.0 if digest >> 63 else -1.0
+        return vectors
+
+
+def get_embedding_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    """
+    Build the configured embedding provider. Providers hold clients bound to the current event
+    loop, so every agent builds its own.
+    """
+    if name == "openai":
+        return OpenAIEmbeddingProvider()
+    if name == "hashing":
+        return HashingEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+class EmbeddingCache:
+    """
+    In-memory LRU of listing embeddings.
+
+    Keys are the provider, the listing's room ID and a hash of the embedded text, so a listing
+    is embedded once per summary no matter which search or URL variant it shows up in.
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES) -> None:
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(provider: EmbeddingProvider, url: str, text: str) -> tuple:
+        return provider.name, canonical_listing_id(url), hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: tuple, vector: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+def cosine_similarities(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    :param query: Vector to compare against
+    :param matrix: One vector per row
+    :return: Cosine similarity of every row to `query`; 0 for zero vectors
+    """
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return (matrix @ query) / np.where(norms == 0, 1, norms)
+
+
+def top_m_indices(scores: np.ndarray, m: int) -> np.ndarray:
+    """
+    Indexes of the `m` highest scores in their original order, without sorting all of them.
+    """
+    if m >= len(scores):
+        return np.arange(len(scores))
+    return np.sort(np.argpartition(-scores, m - 1)[:m])
+
+
+class EmbeddingPreFilter:
+    """
+    Keeps only the listings whose summaries are semantically closest to the user's criteria,
+    so LLM scoring cost grows with `top_m` rather than with the number of candidates.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[EmbeddingProvider] = None,
+        cache: Optional[EmbeddingCache] = None,
+        top_m: int = EMBEDDING_PREFILTER_TOP_M,
+    ) -> None:
+        self._provider = provider or get_embedding_provider()
+        self._cache = cache or get_embedding_cache()
+        self._top_m = top_m
+
+    async def select(self, criteria: str, listings: list[dict]) -> tuple[list[dict], list[float]]:
+        """
+        :param criteria: The user's preferences
+        :param listings: Dictionaries with url and summary
+        :return: The `top_m` closest listings in their original order, and the similarity of
+            every listing in `listings`
+        """
+        if not listings:
+            return [], []
+
+        keys = [EmbeddingCache.key(self._provider, listing['url'], listing['summary']) for listing in listings]
+        vectors = [self._cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        embedded = await self._provider.embed([criteria] + [listings[i]['summary'] for i in missing])
+        for i, vector in zip(missing, embedded[1:]):
+            vectors[i] = vector
+            self._cache.put(keys[i], vector)
+
+        similarities = cosine_similarities(embedded[0], np.vstack(vectors))
+        selected = top_m_indices(similarities, self._top_m)
+        return [listings[i] for i in selected], similarities.tolist()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Return the process-wide listing embedding cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,92 @@
+import json
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Event stream of the search running in the current task, used by the event logger
+current_event_stream: ContextVar[Optional["EventStream"]] = ContextVar("current_event_stream", default=None)
+
+
+class Event:
+    def __init__(self, event_id: int, event_type: str, data: dict) -> None:
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def to_sse(self) -> str:
+        """
+        Format the event as a Server-Sent Events message.
+        """
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class EventStream:
+    """
+    Append-only log of the progress events of one search.
+
+    Agents publish from the search's event loop while any number of HTTP clients follow the
+    stream from request threads. Every event is kept until the stream is dropped, so a client
+    that connects late or reconnects with Last-Event-ID replays what it missed.
+    """
+
+    def __init__(self) -> None:
+        self._events: list[Event] = []
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def publish(self, event_type: str, **data) -> None:
+        with self._condition:
+            if self._closed:
+                return
+            self._events.append(Event(len(self._events) + 1, event_type, data))
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """
+        Mark the stream as finished so listeners stop once they have seen every event.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def listen(self, after: int = 0, keep_alive: float = 15) -> Iterator[Optional[Event]]:
+        """
+        Follow the stream until it is closed.
+
+        :param after: ID of the last event the client has already seen
+        :param keep_alive: Seconds to wait for a new event before yielding None, so idle
+            connections can send a keep-alive comment
+        :return: Iterator over events in publication order
+        """
+        position = after
+        while True:
+            with self._condition:
+                if position >= len(self._events) and not self._closed:
+                    self._condition.wait(keep_alive)
+                events = self._events[position:]
+                closed = self._closed
+            if not events:
+                if closed:
+                    return
+                yield None
+                continue
+            for event in events:
+                yield event
+            position += len(events)
+
+
+class EventStreamLogHandler(logging.Handler):
+    """
+    Forwards orchestration events from the event logger to the stream of the search that logged them.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        event_stream = current_event_stream.get()
+        if event_stream is None:
+            return
+        source = getattr(record.msg, "source", None)
+        message = getattr(record.msg, "message", None)
+        if source is None or message is None:
+            return
+        event_stream.publish("orchestration", source=source, message=message)
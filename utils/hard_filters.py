@@ -0,0 +1,102 @@
+import re
+from typing import Optional
+from utils.ranking import nightly_price
+from config import HARD_FILTER_PRICE_TOLERANCE
+
+# Airbnb amenity titles of the amenities the Parsing Agent can ask for, e.g. "Free washer – In
+# unit" or "Private outdoor pool". Titles must start with the amenity so that "Hair dryer",
+# "Dishwasher" and "Pool table" don't count.
+AMENITY_PATTERNS = {
+    "wifi": re.compile(r"(fast )?wi-?fi\b", re.IGNORECASE),
+    "kitchen": re.compile(r"(shared )?kitchen\b", re.IGNORECASE),
+    "washer": re.compile(r"((free|paid) )?washer\b", re.IGNORECASE),
+    "dryer": re.compile(r"((free|paid) )?dryer\b", re.IGNORECASE),
+    "free parking": re.compile(r"free (street |residential )?parking\b", re.IGNORECASE),
+    "gym": re.compile(r"((private|shared) )?gym\b|exercise equipment\b", re.IGNORECASE),
+    "pool": re.compile(r"((private|shared) )?((indoor|outdoor|rooftop|infinity) )?pool\b(?! table)", re.IGNORECASE),
+}
+# Price qualifiers saying which nights a price covers, e.g. "night" or "for 5 nights"
+PRICE_NIGHTS_PATTERN = re.compile(r"\bnights?\b", re.IGNORECASE)
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class HardFilter:
+    """
+    Drops listings whose scraped facts clearly break the user's search filters.
+
+    Airbnb's search filters are loose, so listings over budget, too small or missing a required
+    amenity still show up. They are dropped before they cost any LLM calls. A constraint is only
+    checked when the listing's page states the fact, so listings without facts always pass.
+
+    The Parsing Agent's maximum price may be per night or for the whole stay, so a listing is
+    only over budget when its nightly price alone exceeds it, which breaks either reading.
+    """
+
+    def __init__(
+        self,
+        price_max: Optional[float] = None,
+        bedrooms: Optional[float] = None,
+        bathrooms: Optional[float] = None,
+        guests: Optional[float] = None,
+        amenities: Optional[list[str]] = None,
+        price_tolerance: float = HARD_FILTER_PRICE_TOLERANCE,
+    ) -> None:
+        self.price_max = price_max
+        self.bedrooms = bedrooms
+        self.bathrooms = bathrooms
+        self.guests = guests
+        self.amenities = [amenity for amenity in amenities or [] if amenity.lower() in AMENITY_PATTERNS]
+        self._price_tolerance = price_tolerance
+
+    @classmethod
+    def from_parsed_fields(cls, parsed_fields: Optional[dict]) -> "HardFilter":
+        """
+        :param parsed_fields: Search filters extracted by the Parsing Agent
+        """
+        parsed_fields = parsed_fields or {}
+        # Infants don't count towards a listing's guest limit on Airbnb
+        guests = sum(_number(parsed_fields.get(field)) or 0 for field in ("guestsAdults", "guestsChildren"))
+        return cls(
+            price_max=_number(parsed_fields.get("priceMax")),
+            bedrooms=_number(parsed_fields.get("bedrooms")),
+            bathrooms=_number(parsed_fields.get("bathrooms")),
+            guests=guests or None,
+            amenities=parsed_fields.get("amenities"),
+        )
+
+    def violations(self, facts: Optional[dict]) -> list[str]:
+        """
+        :param facts: Listing facts extracted from its page, or None
+        :return: Why the listing breaks the filters; empty if it doesn't
+        """
+        if not facts:
+            return []
+        reasons = []
+        capacity = facts.get("capacity") or {}
+
+        # A price without a stated number of nights may be a per-night price or a total
+        price = facts.get("price") or {}
+        price = nightly_price(price) if PRICE_NIGHTS_PATTERN.search(price.get("qualifier") or "") else None
+        if self.price_max and price is not None and price > self.price_max * (1 + self._price_tolerance):
+            reasons.append(f"costs {price:.0f} per night, over the maximum of {self.price_max:.0f}")
+        if self.bedrooms and capacity.get("bedrooms") is not None and capacity["bedrooms"] < self.bedrooms:
+            reasons.append(f"has {capacity['bedrooms']} bedrooms, fewer than {self.bedrooms:g}")
+        if self.bathrooms and capacity.get("bathrooms") is not None and capacity["bathrooms"] < self.bathrooms:
+            reasons.append(f"has {capacity['bathrooms']:g} bathrooms, fewer than {self.bathrooms:g}")
+        if self.guests and capacity.get("guests") is not None and capacity["guests"] < self.guests:
+            reasons.append(f"fits {capacity['guests']} guests, fewer than {self.guests:g}")
+
+        # Only the full amenity list shows an amenity is missing; the preview lists a few of them
+        if facts.get("amenities_complete"):
+            listed = [title.strip() for title in facts.get("amenities") or []]
+            for amenity in self.amenities:
+                pattern = AMENITY_PATTERNS[amenity.lower()]
+                if not any(pattern.match(title) for title in listed):
+                    reasons.append(f"has no {amenity.lower()}")
+        return reasons
@@ -0,0 +1,149 @@
+import asyncio
+import base64
+import io
+from typing import Optional
+from config import (
+    MAX_IMAGES_PER_LISTING,
+    IMAGE_TARGET_SIZE,
+    MIN_IMAGE_SIZE,
+    IMAGE_HASH_DISTANCE,
+    MAX_IMAGE_DOWNLOADS,
+    IMAGE_DOWNLOAD_WIDTH,
+)
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import httpx
+from PIL import Image
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    Difference hash: 64 bits describing the brightness gradient of a 9x8 thumbnail.
+    Resized or recompressed copies of the same photo hash to nearly the same value.
+    """
+    thumbnail = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(thumbnail.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def sized_image_url(url: str, width: int = IMAGE_DOWNLOAD_WIDTH) -> str:
+    """
+    Ask Airbnb's image CDN for a variant `width` pixels wide instead of the full-size original.
+    """
+    parts = urlsplit(url)
+    if not (parts.hostname or "").endswith("muscache.com"):
+        return url
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != "im_w"]
+    query.append(("im_w", str(width)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class PreparedImage:
+    def __init__(self, url: str, data_url: str, phash: int) -> None:
+        self.url = url
+        self.data_url = data_url
+        self.phash = phash
+
+
+class ImagePreprocessor:
+    """
+    Downloads listing images over a pooled HTTP client and reduces them to a few small,
+    distinct photos before vision scoring.
+
+    Tiny images (icons, avatars) are dropped, near-duplicates are removed by perceptual hash,
+    and the rest are downscaled and inlined as JPEG data URLs.
+
+    Use as an async context manager so the connection pool is shared across all listings
+    of one scoring stage.
+    """
+
+    def __init__(
+        self,
+        max_images: int = MAX_IMAGES_PER_LISTING,
+        target_size: int = IMAGE_TARGET_SIZE,
+        min_size: int = MIN_IMAGE_SIZE,
+        hash_distance: int = IMAGE_HASH_DISTANCE,
+        max_downloads: int = MAX_IMAGE_DOWNLOADS,
+    ) -> None:
+        self._max_images = max_images
+        self._target_size = target_size
+        self._min_size = min_size
+        self._hash_distance = hash_distance
+        self._max_downloads = max_downloads
+        self._client = None
+        self._download_semaphore = None
+
+    async def __aenter__(self) -> "ImagePreprocessor":
+        self._client = httpx.AsyncClient(
+            timeout=10,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self._max_downloads),
+        )
+        self._download_semaphore = asyncio.Semaphore(self._max_downloads)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+
+    async def prepare(self, image_urls: list[str]) -> list[str]:
+        """
+        Reduce the images of one listing to at most `max_images` representative photos.
+
+        :param image_urls: Image URLs in page order
+        :return: JPEG data URLs, or the first image URLs unchanged if nothing could be downloaded
+        """
+        candidates = list(dict.fromkeys(
+            url for url in image_urls if not url.split("?")[0].endswith((".gif", ".svg"))
+        ))
+        # Some candidates are dropped as too small or as duplicates, but listings often have
+        # dozens of photos, so only a few times as many as needed are downloaded
+        candidates = candidates[:3 * self._max_images]
+        prepared = await asyncio.gather(*(self._prepare_image(url) for url in candidates))
+
+        selected = []
+        for image in prepared:
+            if image is None:
+                continue
+            if any(hamming_distance(image.phash, kept.phash) <= self._hash_distance for kept in selected):
+                continue
+            selected.append(image)
+            if len(selected) >= self._max_images:
+                break
+
+        print(f"Prepared {len(selected)} of {len(image_urls)} images")
+        if not selected:
+            return candidates[:self._max_images]
+        return [image.data_url for image in selected]
+
+    async def _prepare_image(self, url: str) -> Optional[PreparedImage]:
+        try:
+            async with self._download_semaphore:
+                response = await self._client.get(sized_image_url(url))
+                response.raise_for_status()
+            return await asyncio.to_thread(self._process, url, response.content)
+        except Exception as e:
+            print(f"Error preparing image {url}: {repr(e)}")
+            return None
+
+    def _process(self, url: str, content: bytes) -> Optional[PreparedImage]:
+        image = Image.open(io.BytesIO(content))
+        if min(image.size) < self._min_size:
+            return None
+
+        image = image.convert("RGB")
+        phash = perceptual_hash(image)
+        image.thumbnail((self._target_size, self._target_size))
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=80)
+        data_url = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+        return PreparedImage(url, data_url, phash)
@@ -0,0 +1,249 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from utils.events import EventStream, current_event_stream
+from config import (
+    MAX_CONCURRENT_SEARCHES,
+    MAX_QUEUED_SEARCHES,
+    SEARCH_JOB_RETENTION,
+    SEARCH_DEDUP_WINDOW,
+    SEARCH_DISCONNECT_GRACE,
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class SearchJob:
+    def __init__(self, job_id: str, run_context=None, dedup_key: Optional[str] = None) -> None:
+        self.id = job_id
+        self.run_context = run_context
+        self.dedup_key = dedup_key
+        # One token per submitter; the job is cancelled once every submitter has given it up
+        self.subscriptions: set[str] = set()
+        # Open event streams per subscription
+        self.listeners: dict[str, int] = {}
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._loop = None
+        self._task = None
+        self._future = None
+        self._cancel_requested = False
+        self.events = EventStream()
+        if run_context is not None:
+            run_context.set_event_stream(self.events)
+
+    def is_finished(self) -> bool:
+        return self.status in (COMPLETED, FAILED, CANCELLED)
+
+    def to_dict(self) -> dict:
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "partial_results": self.run_context.progress() if self.run_context else None,
+        }
+        if self.status == COMPLETED:
+            job["sorted_listings"] = self.result
+        if self.error:
+            job["error"] = self.error
+        return job
+
+
+class JobManager:
+    """
+    Runs searches as background jobs so HTTP requests return immediately.
+
+    At most `max_concurrent` jobs run at once, each on its own event loop in a worker thread;
+    up to `max_queued` more wait in line. Cancelling a running job cancels its main task. The
+    agents run on a warm runtime's event loop, which the main task awaits through a chained
+    future, so the cancellation is forwarded to the search's task on that loop; it stops the
+    runtime, and the pool retires the runtime instead of reusing it.
+
+    Every submitter gets a subscription token. Jobs submitted with the same `dedup_key` as one
+    still queued or running attach to it instead of starting again, and a job that completed
+    within `dedup_window` seconds is handed out as is. A job is only cancelled once every
+    subscription has been cancelled, either explicitly or by its event streams disconnecting
+    for longer than `disconnect_grace` seconds.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_SEARCHES,
+        max_queued: int = MAX_QUEUED_SEARCHES,
+        retention: float = SEARCH_JOB_RETENTION,
+        dedup_window: float = SEARCH_DEDUP_WINDOW,
+        disconnect_grace: float = SEARCH_DISCONNECT_GRACE,
+    ) -> None:
+        self._max_queued = max_queued
+        self._disconnect_grace = disconnect_grace
+        self._retention = retention
+        self._dedup_window = dedup_window
+        self._jobs_by_key: dict[str, SearchJob] = {}
+        self.deduplicated = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="search-job")
+        self._jobs: dict[str, SearchJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        run,
+        job_id: Optional[str] = None,
+        run_context=None,
+        dedup_key: Optional[str] = None,
+    ) -> tuple[SearchJob, str]:
+        """
+        Queue a job, or return an identical one that is in flight or fresh.
+
+        :param run: Coroutine function taking the job and returning its result
+        :param job_id: Optional ID for the job, a new UUID by default
+        :param run_context: Optional RunContext used to report partial results
+        :param dedup_key: Optional key under which identical jobs are shared
+        :return: The queued or shared job, and the submitter's subscription token
+        """
+        subscription = str(uuid.uuid4())
+        with self._lock:
+            self._purge()
+            shared = self._jobs_by_key.get(dedup_key) if dedup_key is not None else None
+            if shared is not None and self._is_shareable(shared):
+                shared.subscriptions.add(subscription)
+                self.deduplicated += 1
+                print(f"Attached search to job {shared.id} ({shared.status})")
+                return shared, subscription
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if queued >= self._max_queued:
+                raise QueueFullError(f"{queued} searches are already waiting")
+            job = SearchJob(job_id or str(uuid.uuid4()), run_context, dedup_key)
+            job.subscriptions.add(subscription)
+            self._jobs[job.id] = job
+            if dedup_key is not None:
+                self._jobs_by_key[dedup_key] = job
+            job._future = self._executor.submit(self._run, job, run)
+        return job, subscription
+
+    def get(self, job_id: str) -> Optional[SearchJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str, subscription: str) -> Optional[SearchJob]:
+        """
+        Give up one subscription to a job, cancelling the job if it was the last one.
+
+        :param subscription: Token returned by `submit`; unknown tokens change nothing
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished() or subscription not in job.subscriptions:
+                return job
+            job.subscriptions.discard(subscription)
+            if job.subscriptions:
+                # Other submitters still want the result
+                return job
+            job._cancel_requested = True
+            if job.status == QUEUED and job._future.cancel():
+                self._finish(job, CANCELLED)
+            elif job._loop is not None:
+                try:
+                    job._loop.call_soon_threadsafe(job._task.cancel)
+                except RuntimeError:  # The loop already closed
+                    pass
+        return job
+
+    def connect(self, job: SearchJob, subscription: Optional[str]) -> None:
+        """
+        Record that an event stream of `subscription` opened.
+        """
+        if subscription is None:
+            return
+        with self._lock:
+            job.listeners[subscription] = job.listeners.get(subscription, 0) + 1
+
+    def disconnect(self, job: SearchJob, subscription: Optional[str]) -> None:
+        """
+        Record that an event stream of `subscription` closed. If the subscriber doesn't
+        reconnect within the grace period, its subscription is cancelled.
+        """
+        if subscription is None:
+            return
+        with self._lock:
+            job.listeners[subscription] = job.listeners.get(subscription, 1) - 1
+            if job.listeners[subscription] > 0 or job.is_finished():
+                return
+        timer = threading.Timer(self._disconnect_grace, self._cancel_if_disconnected, (job, subscription))
+        timer.daemon = True
+        timer.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                status: statuses.count(status)
+                for status in (QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED)
+            } | {"deduplicated": self.deduplicated}
+
+    def _run(self, job: SearchJob, run) -> None:
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+        job.events.publish("status", status=RUNNING, error=None)
+        try:
+            result = asyncio.run(self._run_async(job, run))
+            self._finish(job, COMPLETED, result=result)
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            print(f"Error running search {job.id}: {repr(e)}")
+            self._finish(job, FAILED, error=str(e))
+
+    async def _run_async(self, job: SearchJob, run):
+        with self._lock:
+            if job._cancel_requested:
+                raise asyncio.CancelledError()
+            job._loop = asyncio.get_running_loop()
+            job._task = asyncio.current_task()
+        current_event_stream.set(job.events)
+        return await run(job)
+
+    def _cancel_if_disconnected(self, job: SearchJob, subscription: str) -> None:
+        with self._lock:
+            reconnected = job.listeners.get(subscription, 0) > 0
+        if not reconnected:
+            print(f"Subscriber of search {job.id} disconnected")
+            self.cancel(job.id, subscription)
+
+    def _is_shareable(self, job: SearchJob) -> bool:
+        if job._cancel_requested:
+            return False
+        if not job.is_finished():
+            return True
+        return job.status == COMPLETED and time.time() - job.finished_at <= self._dedup_window
+
+    def _finish(self, job: SearchJob, status: str, result=None, error=None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job._loop = None
+        job._task = None
+        job.events.publish("status", status=status, error=error)
+        job.events.close()
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self._retention
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished() and job.finished_at < cutoff]:
+            job = self._jobs.pop(job_id)
+            if self._jobs_by_key.get(job.dedup_key) is job:
+                del self._jobs_by_key[job.dedup_key]
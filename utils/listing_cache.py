@@ -0,0 +1,151 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+from config import DATABASE, LISTING_CACHE_TTL, LISTING_CACHE_MAX_BYTES
+
+ROOM_ID_PATTERN = re.compile(r"/rooms/(?:plus/)?(\d+)")
+
+
+def canonical_listing_id(url: str) -> str:
+    """
+    Reduce a listing URL to a stable cache key.
+
+    Airbnb listing URLs carry search state (dates, guests, tracking IDs) in the query string,
+    so the room ID is used when present and the bare URL without query or fragment otherwise.
+    """
+    match = ROOM_ID_PATTERN.search(url)
+    if match:
+        return f"rooms/{match.group(1)}"
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}".rstrip("/")
+
+
+class ListingCache:
+    """
+    SQLite-backed cache of scraped listing content keyed by canonical room ID.
+
+    Entries expire after `ttl` seconds, and the least recently scraped entries are evicted once
+    the stored content exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        database: str = DATABASE,
+        ttl: float = LISTING_CACHE_TTL,
+        max_bytes: int = LISTING_CACHE_MAX_BYTES,
+    ) -> None:
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(database, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS listing_cache (
+                listing_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                text TEXT NOT NULL,
+                images TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                facts TEXT
+            )
+            """
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(listing_cache)")]
+        if "facts" not in columns:
+            self._db.execute("ALTER TABLE listing_cache ADD COLUMN facts TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS listing_cache_fetched_at ON listing_cache (fetched_at)")
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Look up the scraped content of a listing.
+
+        :param url: Any URL of the listing
+        :return: Dictionary with text, images, facts and content_hash, or None on a miss
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT text, images, content_hash, fetched_at, facts FROM listing_cache WHERE listing_id = ?",
+                (canonical_listing_id(url),),
+            ).fetchone()
+            if row is None or time.time() - row[3] > self._ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {
+            "text": row[0],
+            "images": json.loads(row[1]),
+            "facts": json.loads(row[4]) if row[4] else None,
+            "content_hash": row[2],
+        }
+
+    def put(self, url: str, listing_content: dict) -> None:
+        """
+        Store the scraped content of a listing.
+
+        :param url: Any URL of the listing
+        :param listing_content: Dictionary with text, images and optionally facts
+        """
+        text = listing_content["text"]
+        images = json.dumps(listing_content["images"])
+        facts = json.dumps(listing_content["facts"]) if listing_content.get("facts") else None
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO listing_cache (listing_id, url, text, images, content_hash, size, fetched_at, facts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (canonical_listing_id(url), url, text, images, content_hash, len(text) + len(images) + len(facts or ""), time.time(), facts),
+            )
+            self._evict()
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM listing_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _evict(self) -> None:
+        self._db.execute("DELETE FROM listing_cache WHERE fetched_at < ?", (time.time() - self._ttl,))
+        # Keep the newest entries whose cumulative size fits in the budget
+        self._db.execute(
+            """
+            DELETE FROM listing_cache WHERE listing_id IN (
+                SELECT listing_id FROM (
+                    SELECT listing_id, SUM(size) OVER (ORDER BY fetched_at DESC) AS running_size
+                    FROM listing_cache
+                ) WHERE running_size > ?
+            )
+            """,
+            (self._max_bytes,),
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_listing_cache() -> ListingCache:
+    """
+    Return the process-wide listing cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ListingCache()
+        return _cache
@@ -0,0 +1,223 @@
+import html
+import json
+import re
+from typing import Optional
+
+# Airbnb renders the listing's data into deferred-state JSON blobs, so they can be pulled out
+# with a regex instead of building a DOM for the whole page
+STATE_SCRIPT_PATTERN = re.compile(
+    r'<script[^>]*id="data-deferred-state[^"]*"[^>]*>(.*?)</script>',
+    re.DOTALL,
+)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+LINE_BREAK_PATTERN = re.compile(r"<br\s*/?>|</p>|</li>", re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r"(\d+(?:[.,]\d+)*)")
+
+
+def _walk(obj):
+    """
+    Yield every dictionary nested inside `obj`.
+    """
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+
+def _first(state, key: str):
+    for node in _walk(state):
+        value = node.get(key)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def _parse_number(text) -> Optional[float]:
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not isinstance(text, str):
+        return None
+    match = NUMBER_PATTERN.search(text)
+    if not match:
+        return None
+    return float(match.group(1).replace(",", ""))
+
+
+def _load_state(html_content: str) -> Optional[list]:
+    blobs = []
+    for match in STATE_SCRIPT_PATTERN.finditer(html_content):
+        try:
+            blobs.append(json.loads(html.unescape(match.group(1))))
+        except ValueError:
+            continue
+    return blobs or None
+
+
+def _extract_price(state) -> Optional[dict]:
+    display_price = _first(state, "structuredDisplayPrice")
+    if not isinstance(display_price, dict):
+        return None
+    primary_line = display_price.get("primaryLine") or {}
+    label = (
+        primary_line.get("discountedPrice")
+        or primary_line.get("price")
+        or primary_line.get("accessibilityLabel")
+    )
+    if not label:
+        return None
+    return {
+        "label": label,
+        "amount": _parse_number(label),
+        "qualifier": primary_line.get("qualifier"),
+    }
+
+
+def _extract_amenities(state) -> tuple[list[str], bool]:
+    """
+    :return: Titles of the available amenities, and whether that is all of them rather than
+        the handful the page previews
+    """
+    amenities = []
+    groups = _first(state, "seeAllAmenitiesGroups")
+    complete = bool(groups)
+    if not complete:
+        groups = _first(state, "previewAmenitiesGroups") or []
+    for group in groups:
+        for amenity in group.get("amenities", []) or []:
+            if amenity.get("available", True) and amenity.get("title"):
+                amenities.append(amenity["title"])
+    return list(dict.fromkeys(amenities)), complete
+
+
+def is_listing_photo(url: str) -> bool:
+    """
+    Whether an image URL is a photo uploaded for a listing. Host avatars and Airbnb's own
+    icons are served from the same picture CDN under their own paths.
+    """
+    path = url.split("?")[0]
+    return (
+        url.startswith("http")
+        and "/pictures/" in path
+        and "/user/" not in path
+        and "/airbnb-platform-assets/" not in path
+        and not path.endswith((".gif", ".svg"))
+    )
+
+
+def _extract_photos(state) -> list[str]:
+    photos = []
+    for node in _walk(state):
+        base_url = node.get("baseUrl")
+        if isinstance(base_url, str) and is_listing_photo(base_url):
+            photos.append(base_url)
+    return list(dict.fromkeys(photos))
+
+
+def _extract_reviews(state, limit: int = 10) -> list[str]:
+    reviews = []
+    for review in _first(state, "reviews") or []:
+        if isinstance(review, dict) and review.get("comments"):
+            reviews.append(TAG_PATTERN.sub(" ", review["comments"]).strip())
+        if len(reviews) >= limit:
+            break
+    return reviews
+
+
+def _extract_capacity(state) -> dict:
+    capacity = {}
+    guests = _first(state, "personCapacity")
+    if guests:
+        capacity["guests"] = int(guests)
+    for node in _walk(state):
+        for item in node.get("overviewItems", []) or []:
+            title = (item.get("title") or "").lower()
+            count = _parse_number(title)
+            if count is None:
+                continue
+            if "guest" in title:
+                capacity.setdefault("guests", int(count))
+            elif "bedroom" in title:
+                capacity.setdefault("bedrooms", int(count))
+            elif "bath" in title:
+                capacity.setdefault("bathrooms", count)
+            elif "bed" in title:
+                capacity.setdefault("beds", int(count))
+    return capacity
+
+
+def extract_listing_facts(html_content: str) -> Optional[dict]:
+    """
+    Extract a compact structured record of a listing from the JSON state embedded in its page.
+
+    :param html_content: Rendered HTML of an Airbnb listing page
+    :return: Dictionary of listing facts, or None if the embedded state is missing or unusable
+    """
+    state = _load_state(html_content)
+    if state is None:
+        return None
+
+    sharing_config = _first(state, "sharingConfig") or {}
+    title = sharing_config.get("title") or _first(state, "listingTitle")
+    photos = _extract_photos(state)
+    if not title or not photos:
+        return None
+
+    description = _first(state, "htmlDescription")
+    if isinstance(description, dict):
+        description = description.get("htmlText")
+    if isinstance(description, str):
+        description = TAG_PATTERN.sub("", LINE_BREAK_PATTERN.sub("\n", description))
+        description = "\n".join(line.strip() for line in description.splitlines() if line.strip())
+
+    latitude = _first(state, "lat")
+    longitude = _first(state, "lng")
+    amenities, amenities_complete = _extract_amenities(state)
+
+    return {
+        "title": title,
+        "property_type": sharing_config.get("propertyType"),
+        "price": _extract_price(state),
+        "rating": _parse_number(_first(state, "guestSatisfactionOverall") or sharing_config.get("starRating")),
+        "review_count": _parse_number(_first(state, "visibleReviewCount") or sharing_config.get("reviewCount")),
+        "capacity": _extract_capacity(state),
+        "amenities": amenities,
+        "amenities_complete": amenities_complete,
+        "location": {
+            "name": sharing_config.get("location") or _first(state, "localizedLocation"),
+            "latitude": latitude if isinstance(latitude, (int, float)) else None,
+            "longitude": longitude if isinstance(longitude, (int, float)) else None,
+        },
+        "description": description,
+        "reviews": _extract_reviews(state),
+        "photos": photos,
+    }
+
+
+def format_listing_facts(facts: dict) -> str:
+    """
+    Render the structured record as the compact text sent to the summarizer.
+    """
+    lines = [f"Title: {facts['title']}"]
+    if facts.get("property_type"):
+        lines.append(f"Property type: {facts['property_type']}")
+    if facts.get("price"):
+        price = facts["price"]
+        lines.append(f"Price: {price['label']}" + (f" {price['qualifier']}" if price.get("qualifier") else ""))
+    if facts.get("rating") is not None:
+        lines.append(f"Rating: {facts['rating']}" + (f" ({int(facts['review_count'])} reviews)" if facts.get("review_count") else ""))
+    if facts.get("capacity"):
+        lines.append("Capacity: " + ", ".join(f"{value} {key}" for key, value in facts["capacity"].items()))
+    location = facts.get("location") or {}
+    if location.get("name"):
+        lines.append(f"Location: {location['name']}")
+    if facts.get("amenities"):
+        lines.append("Amenities: " + ", ".join(facts["amenities"]))
+    if facts.get("description"):
+        lines.append(f"Description:\n{facts['description']}")
+    if facts.get("reviews"):
+        lines.append("Reviews:\n" + "\n".join(f"- {review}" for review in facts["reviews"]))
+    return "\n".join(lines)
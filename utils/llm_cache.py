@@ -0,0 +1,185 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Optional
+from config import DATABASE, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_DISK_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_POLICY
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ParsedChatCompletion
+
+
+def cache_key(model: str, messages: list, response_format=None, temperature: Optional[float] = None) -> str:
+    """
+    Content-addressed key for a chat completion request.
+    """
+    if response_format is not None and hasattr(response_format, "model_json_schema"):
+        response_format = {"name": response_format.__name__, "schema": response_format.model_json_schema()}
+    payload = {
+        "model": model,
+        "messages": messages,
+        "response_format": response_format,
+        "temperature": temperature,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier cache of chat completion responses: an in-memory LRU in front of a SQLite table.
+
+    Responses are stored as the JSON of the OpenAI response object so cached and live calls
+    return the same types to the agents.
+    """
+
+    def __init__(
+        self,
+        database: str = DATABASE,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_disk_entries: int = LLM_CACHE_MAX_DISK_ENTRIES,
+        ttl: float = LLM_CACHE_TTL,
+    ) -> None:
+        self._max_entries = max_entries
+        self._max_disk_entries = max_disk_entries
+        self._ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(database, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._db.commit()
+        self._stats = {}
+
+    def get(self, key: str, agent: str) -> Optional[str]:
+        with self._lock:
+            response = self._memory.get(key)
+            if response is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._db.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and time.time() - row[1] <= self._ttl:
+                    response = row[0]
+                    self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, response)
+            self._record(agent, response is not None)
+        return response
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, response)
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self._max_disk_entries,),
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        """
+        Hit rates per agent.
+        """
+        with self._lock:
+            return {
+                agent: {
+                    "hits": counts["hits"],
+                    "misses": counts["misses"],
+                    "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"]),
+                }
+                for agent, counts in self._stats.items()
+            }
+
+    def _remember(self, key: str, response: str) -> None:
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _record(self, agent: str, hit: bool) -> None:
+        counts = self._stats.setdefault(agent, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """
+    Return the process-wide LLM response cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+class CachedAsyncOpenAI:
+    """
+    Drop-in wrapper around `AsyncOpenAI` for the agents' chat completion calls.
+
+    Calls keep the usual `chat.completions.create` / `beta.chat.completions.parse` shape and take an
+    extra `call_site` argument. Whether a call is cached is decided by `LLM_CACHE_POLICY[call_site]`;
+    unknown call sites are never cached.
+    """
+
+    def __init__(self, agent: str, client: Optional[AsyncOpenAI] = None, cache: Optional[LLMCache] = None) -> None:
+        self._agent = agent
+        self._client = client or AsyncOpenAI()
+        self._cache = cache
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self._parse)))
+
+    async def _create(self, call_site: Optional[str] = None, **kwargs) -> ChatCompletion:
+        return await self._cached(
+            call_site,
+            kwargs,
+            self._client.chat.completions.create,
+            ChatCompletion,
+        )
+
+    async def _parse(self, call_site: Optional[str] = None, **kwargs) -> ParsedChatCompletion:
+        return await self._cached(
+            call_site,
+            kwargs,
+            self._client.beta.chat.completions.parse,
+            ParsedChatCompletion[kwargs.get("response_format")],
+        )
+
+    async def _cached(self, call_site, kwargs, call, response_type):
+        if not LLM_CACHE_POLICY.get(call_site, False):
+            return await call(**kwargs)
+
+        cache = self._cache or get_llm_cache()
+        key = cache_key(
+            kwargs.get("model"),
+            kwargs.get("messages"),
+            kwargs.get("response_format"),
+            kwargs.get("temperature"),
+        )
+        cached_response = cache.get(key, self._agent)
+        if cached_response is not None:
+            return response_type.model_validate_json(cached_response)
+
+        response = await call(**kwargs)
+        cache.put(key, response.model_dump_json())
+        return response
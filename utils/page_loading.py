@@ -0,0 +1,121 @@
+import threading
+import time
+from urllib.parse import urlsplit
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from config import (
+    SEARCH_PAGE_TIMEOUT,
+    LISTING_PAGE_TIMEOUT,
+    PREVIEW_PAGE_TIMEOUT,
+    BLOCKED_RESOURCE_TYPES,
+    BLOCKED_REQUEST_DOMAINS,
+)
+
+
+class PageLoadPolicy:
+    """
+    How long to load a kind of page and when it is ready to be read.
+
+    A page counts as ready once `ready_selector` is attached to the DOM, which for Airbnb
+    happens long before the network goes idle. If it never appears, the page is read as it is
+    when `timeout` milliseconds have passed since navigation started.
+    """
+
+    def __init__(self, name: str, ready_selector: str, timeout: float) -> None:
+        self.name = name
+        self.ready_selector = ready_selector
+        self.timeout = timeout
+
+
+# Search results are ready once the first listing cards link to their rooms
+SEARCH_RESULTS_PAGE = PageLoadPolicy("search_results", 'a[href*="/rooms/"]', SEARCH_PAGE_TIMEOUT)
+# Listing facts come from the deferred state; the title is there for pages without it
+LISTING_PAGE = PageLoadPolicy("listing", 'script[id^="data-deferred-state"], h1', LISTING_PAGE_TIMEOUT)
+PREVIEW_PAGE = PageLoadPolicy("preview", 'picture img, meta[property="og:image"]', PREVIEW_PAGE_TIMEOUT)
+
+
+def should_block(resource_type: str, url: str) -> bool:
+    """
+    Whether a request is not needed to read text and URLs off a page.
+
+    Blocked images are still in the DOM with their URLs, they are just never downloaded.
+    """
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(url).hostname or ""
+    return any(host == domain or host.endswith(f".{domain}") for domain in BLOCKED_REQUEST_DOMAINS)
+
+
+class PageLoadMetrics:
+    """
+    Timings of page loads per policy and counts of blocked requests.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loads: dict[str, dict] = {}
+        self.blocked_requests: dict[str, int] = {}
+
+    def record_load(self, policy: PageLoadPolicy, navigation_seconds: float, total_seconds: float, ready: bool) -> None:
+        with self._lock:
+            loads = self._loads.setdefault(policy.name, {
+                "loads": 0,
+                "deadline_hits": 0,
+                "navigation_seconds": 0.0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0,
+            })
+            loads["loads"] += 1
+            loads["deadline_hits"] += not ready
+            loads["navigation_seconds"] += navigation_seconds
+            loads["total_seconds"] += total_seconds
+            loads["max_seconds"] = max(loads["max_seconds"], total_seconds)
+
+    def record_blocked(self, resource_type: str) -> None:
+        with self._lock:
+            self.blocked_requests[resource_type] = self.blocked_requests.get(resource_type, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": {
+                    name: {
+                        "loads": loads["loads"],
+                        "deadline_hits": loads["deadline_hits"],
+                        "avg_navigation_seconds": loads["navigation_seconds"] / loads["loads"],
+                        "avg_seconds": loads["total_seconds"] / loads["loads"],
+                        "max_seconds": loads["max_seconds"],
+                    }
+                    for name, loads in self._loads.items()
+                },
+                "blocked_requests": dict(self.blocked_requests),
+            }
+
+
+async def load_page(page, url: str, policy: PageLoadPolicy, metrics: PageLoadMetrics) -> str:
+    """
+    Navigate `page` to `url` and return its HTML once the policy considers it ready.
+
+    :param page: Playwright page with requests already filtered by `should_block`
+    :param url: Page to load
+    :param policy: Readiness selector and deadline for this kind of page
+    :param metrics: Where to record the load's timings
+    :return: HTML of the page when ready, or at the deadline
+    """
+    start_time = time.perf_counter()
+    await page.goto(url, timeout=policy.timeout, wait_until="domcontentloaded")
+    navigation_seconds = time.perf_counter() - start_time
+
+    ready = False
+    remaining = policy.timeout - navigation_seconds * 1000
+    if remaining > 0:  # Playwright treats a timeout of 0 as no timeout at all
+        try:
+            await page.wait_for_selector(policy.ready_selector, state="attached", timeout=remaining)
+            ready = True
+        except PlaywrightTimeoutError:
+            pass
+    html_content = await page.content()
+
+    total_seconds = time.perf_counter() - start_time
+    metrics.record_load(policy, navigation_seconds, total_seconds, ready)
+    print(f"Loaded {policy.name} page in {total_seconds:.2f}s{'' if ready else ' (deadline reached)'}: {url}")
+    return html_content
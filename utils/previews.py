@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from bs4 import BeautifulSoup
+from utils.browser_pool import get_browser_pool
+from utils.page_loading import PREVIEW_PAGE
+from utils.listing_cache import ListingCache, canonical_listing_id, get_listing_cache
+from utils.listing_extraction import extract_listing_facts, is_listing_photo
+from utils.result_store import ResultStore, get_result_store
+from config import PREVIEW_IMAGE_COUNT, PREVIEW_CACHE_TTL, PREVIEW_CACHE_MAX_ENTRIES
+
+
+def preview_images(image_urls: list[str]) -> list[str]:
+    """
+    Pick the photos shown on a result card, skipping icons, animations and host avatars.
+    """
+    return [src for src in dict.fromkeys(image_urls) if is_listing_photo(src)][:PREVIEW_IMAGE_COUNT]
+
+
+def extract_preview_images(html_content: str) -> list[str]:
+    """
+    Find preview photos on a rendered listing page.
+    """
+    # The listing's own photo list, when the page has one, holds nothing but listing photos
+    facts = extract_listing_facts(html_content)
+    if facts and (images := preview_images(facts["photos"])):
+        return images
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    image_urls = []
+
+    # Extract images from <picture> tags
+    for picture in soup.find_all('picture', recursive=True):
+        img = picture.find('img')
+        if img and (src := img.get('src')):
+            image_urls.append(src)
+
+    # Extract preloaded images
+    for link in soup.find_all('link', {'rel': 'preload', 'as': 'image'}):
+        if href := link.get('href'):
+            image_urls.append(href)
+
+    # Extract meta images
+    meta_images = soup.find_all('meta', {'property': 'og:image'}) or soup.find_all('meta', {'itemprop': 'image'})
+    for meta in meta_images:
+        if content := meta.get('content'):
+            image_urls.append(content)
+
+    return preview_images(image_urls)
+
+
+def previews_etag(previews: dict[str, list[str]]) -> str:
+    """
+    Validator of a previews response, so unchanged previews needn't be sent again.
+    """
+    return hashlib.sha256(json.dumps(previews, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+
+
+class PreviewCache:
+    """
+    In-memory LRU of rendered preview photos keyed by listing ID, each reused for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float = PREVIEW_CACHE_TTL, max_entries: int = PREVIEW_CACHE_MAX_ENTRIES) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, listing_id: str) -> Optional[list[str]]:
+        with self._lock:
+            entry = self._entries.get(listing_id)
+            if entry is None or time.time() - entry[0] > self._ttl:
+                self._entries.pop(listing_id, None)
+                return None
+            self._entries.move_to_end(listing_id)
+            return list(entry[1])
+
+    def put(self, listing_id: str, images: list[str]) -> None:
+        with self._lock:
+            self._entries[listing_id] = (time.time(), list(images))
+            self._entries.move_to_end(listing_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class PreviewService:
+    """
+    Resolves preview photos for many listings at once.
+
+    Photos come from, in order: previews rendered recently, the image URLs stored by the
+    Browsing Agent for any run, and the scraped listing cache. Only listings found in none
+    of them are rendered, all at once on the shared browser pool.
+    """
+
+    def __init__(
+        self,
+        result_store: Optional[ResultStore] = None,
+        listing_cache: Optional[ListingCache] = None,
+        rendered_cache: Optional[PreviewCache] = None,
+    ) -> None:
+        self._result_store = result_store or get_result_store()
+        self._listing_cache = listing_cache or get_listing_cache()
+        self._rendered_cache = rendered_cache or PreviewCache()
+        self._lock = threading.Lock()
+        self.served = {"rendered_cache": 0, "result_store": 0, "listing_cache": 0, "rendered": 0}
+
+    def get_previews(self, urls: list[str]) -> dict[str, list[str]]:
+        """
+        :param urls: Listing URLs
+        :return: Up to PREVIEW_IMAGE_COUNT photo URLs keyed by listing URL; empty if none were found
+        """
+        previews, missing = self.lookup(urls)
+        previews.update(self.render(missing))
+        return previews
+
+    def lookup(self, urls: list[str]) -> tuple[dict[str, list[str]], list[str]]:
+        """
+        Resolve previews from stored data only, without rendering any page.
+
+        :param urls: Listing URLs
+        :return: Photo URLs keyed by listing URL, empty for the listings that must be rendered,
+            and the URLs of those listings
+        """
+        urls = list(dict.fromkeys(urls))
+        previews = {}
+        for url in urls:
+            images = self._rendered_cache.get(canonical_listing_id(url))
+            if images:
+                previews[url] = images
+                self._count("rendered_cache")
+
+        stored = self._result_store.get_listing_images([url for url in urls if url not in previews])
+        for url, images in stored.items():
+            if images := preview_images(images):
+                previews[url] = images
+                self._count("result_store")
+
+        missing = []
+        for url in urls:
+            if url in previews:
+                continue
+            cached_content = self._listing_cache.get(url)
+            if cached_content and (images := preview_images(cached_content['images'])):
+                previews[url] = images
+                self._count("listing_cache")
+            else:
+                missing.append(url)
+
+        return {url: previews.get(url, []) for url in urls}, missing
+
+    def render(self, urls: list[str]) -> dict[str, list[str]]:
+        """
+        Render the pages of listings with no stored previews, all at once.
+
+        :return: Photo URLs keyed by listing URL; empty if none were found
+        """
+        if not urls:
+            return {}
+        rendered = asyncio.run(self._render_all(urls))
+        for url, images in zip(urls, rendered):
+            if images:
+                self._rendered_cache.put(canonical_listing_id(url), images)
+                self._count("rendered")
+        return dict(zip(urls, rendered))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.served, "rendered_cache_entries": len(self._rendered_cache)}
+
+    async def _render_all(self, urls: list[str]) -> list[list[str]]:
+        return await asyncio.gather(*(self._render(url) for url in urls))
+
+    async def _render(self, url: str) -> list[str]:
+        try:
+            html_content = await get_browser_pool().fetch_html(url, PREVIEW_PAGE)
+            return await asyncio.to_thread(extract_preview_images, html_content)
+        except Exception as e:
+            print(f"Error fetching preview for {url}: {repr(e)}")
+            return []
+
+    def _count(self, source: str) -> None:
+        with self._lock:
+            self.served[source] += 1
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_preview_service() -> PreviewService:
+    """
+    Return the process-wide preview service.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PreviewService()
+        return _service
@@ -0,0 +1,216 @@
+import re
+from typing import Optional
+import numpy as np
+from utils.listing_cache import canonical_listing_id
+from config import RANKING_WEIGHTS, RANKING_MISSING_SIGNAL, DISTANCE_SCALE_KM
+
+SIGNALS = ("description", "image", "price_fit", "rating", "review_count", "distance")
+NIGHTS_PATTERN = re.compile(r"(\d+)\s*night")
+EARTH_RADIUS_KM = 6371.0
+
+
+def price_range(parsed_fields: Optional[dict]) -> tuple[Optional[float], Optional[float]]:
+    """
+    :param parsed_fields: Search filters extracted by the Parsing Agent
+    :return: Minimum and maximum nightly price the user asked for, None where not given
+    """
+    parsed_fields = parsed_fields or {}
+
+    def number(value) -> Optional[float]:
+        try:
+            return float(value) if value not in (None, "") else None
+        except (TypeError, ValueError):
+            return None
+
+    return number(parsed_fields.get("priceMin")), number(parsed_fields.get("priceMax"))
+
+
+def nightly_price(price: Optional[dict]) -> Optional[float]:
+    """
+    Price per night of a listing's scraped price, which is a total when dates were given.
+    """
+    if not price or price.get("amount") is None:
+        return None
+    match = NIGHTS_PATTERN.search(price.get("qualifier") or "")
+    nights = int(match.group(1)) if match else 1
+    return price["amount"] / max(nights, 1)
+
+
+def resolve_weights(weights: Optional[dict] = None) -> dict[str, float]:
+    """
+    Fill in the configured weight of every signal not given in `weights`.
+    """
+    resolved = {**RANKING_WEIGHTS, **(weights or {})}
+    unknown = set(resolved) - set(SIGNALS)
+    if unknown:
+        raise ValueError(f"Unknown ranking signals: {', '.join(sorted(unknown))}")
+    if any(float(weight) < 0 for weight in resolved.values()):
+        raise ValueError("Ranking weights must not be negative")
+    return {signal: float(resolved.get(signal, 0.0)) for signal in SIGNALS}
+
+
+class ScoreTable:
+    """
+    Ranking signals of a run's candidates, stored column-wise and keyed by listing ID.
+
+    Every signal is scaled to [0, 1], with NaN where a listing lacks the data for it. A listing's
+    score is the weighted mean of all signals with the same weights for every listing, a missing
+    signal counting as `missing_signal`. Signals no listing has are left out. The table can be
+    ranked again with any weights without scoring anything anew.
+    """
+
+    def __init__(
+        self,
+        listing_ids: list[str],
+        urls: list[str],
+        columns: dict[str, np.ndarray],
+        missing_signal: float = RANKING_MISSING_SIGNAL,
+    ) -> None:
+        self.listing_ids = listing_ids
+        self.urls = urls
+        self.columns = columns
+        self._missing_signal = missing_signal
+        self._matrix = np.column_stack([columns[signal] for signal in SIGNALS]) if listing_ids else np.empty((0, len(SIGNALS)))
+
+    @classmethod
+    def from_results(
+        cls,
+        description_scores: dict[str, dict],
+        image_scores: dict[str, dict],
+        listing_facts: Optional[dict[str, Optional[dict]]] = None,
+        prices: tuple[Optional[float], Optional[float]] = (None, None),
+    ) -> "ScoreTable":
+        """
+        Build the table of the listings scored by both the Description and Image Analysis Agents.
+
+        :param description_scores: Dictionaries with score and reasoning keyed by listing URL
+        :param image_scores: Dictionaries with score and reasoning keyed by listing URL
+        :param listing_facts: Scraped listing facts keyed by listing URL
+        :param prices: Minimum and maximum nightly price the user asked for
+        """
+        # URLs of one listing can differ between stages, so join on the room ID
+        image_by_id = {canonical_listing_id(url): result for url, result in image_scores.items()}
+        facts_by_id = {canonical_listing_id(url): facts for url, facts in (listing_facts or {}).items() if facts}
+
+        listing_ids, urls, raw = [], [], {key: [] for key in ("description", "image", "price", "rating", "reviews", "lat", "lng")}
+        seen = set()
+        for url, description_result in description_scores.items():
+            listing_id = canonical_listing_id(url)
+            if listing_id not in image_by_id or listing_id in seen:
+                continue
+            seen.add(listing_id)
+            facts = facts_by_id.get(listing_id, {})
+            location = facts.get("location") or {}
+            listing_ids.append(listing_id)
+            urls.append(url)
+            raw["description"].append(description_result['score'])
+            raw["image"].append(image_by_id[listing_id]['score'])
+            raw["price"].append(nightly_price(facts.get("price")))
+            raw["rating"].append(facts.get("rating"))
+            raw["reviews"].append(facts.get("review_count"))
+            raw["lat"].append(location.get("latitude"))
+            raw["lng"].append(location.get("longitude"))
+
+        raw = {key: np.array([np.nan if value is None else value for value in values], dtype=float) for key, values in raw.items()}
+        columns = {
+            # LLM scores are 1 to 5
+            "description": (raw["description"] - 1) / 4,
+            "image": (raw["image"] - 1) / 4,
+            "price_fit": _price_fit(raw["price"], *prices),
+            # New listings report a rating of 0 until they are reviewed
+            "rating": np.where(raw["reviews"] == 0, np.nan, np.clip(raw["rating"] / 5, 0, 1)),
+            "review_count": _review_count(raw["reviews"]),
+            "distance": _distance(raw["lat"], raw["lng"]),
+        }
+        return cls(listing_ids, urls, columns)
+
+    def __len__(self) -> int:
+        return len(self.listing_ids)
+
+    def scores(self, weights: Optional[dict] = None) -> np.ndarray:
+        """
+        :return: Weighted mean of every listing's signals, missing ones filled with the neutral value
+        """
+        w = np.array(list(resolve_weights(weights).values()))
+        # A signal no candidate has would only shift every score by the same amount
+        w = np.where(np.isnan(self._matrix).all(axis=0), 0.0, w)
+        total_weight = w.sum()
+        if total_weight == 0:
+            return np.zeros(len(self))
+        return (np.where(np.isnan(self._matrix), self._missing_signal, self._matrix) @ w) / total_weight
+
+    def top_k(self, k: int, weights: Optional[dict] = None) -> list[int]:
+        """
+        Indexes of the `k` best listings, best first, without sorting the whole table.
+        Ties keep the order the listings were scored in, also at the cutoff.
+        """
+        scores = self.scores(weights)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        # Listings tied with the k-th best may fall on either side of the partition, so the
+        # cutoff score is widened to all of them before picking the first in scored order
+        cutoff = -np.partition(-scores, k - 1)[k - 1]
+        candidates = np.flatnonzero(scores >= cutoff)
+        return candidates[np.lexsort((candidates, -scores[candidates]))][:k].tolist()
+
+    def rank(self, k: int, weights: Optional[dict] = None) -> list[dict]:
+        """
+        :return: Dictionaries with url, listing_id, score and each signal of the `k` best listings
+        """
+        scores = self.scores(weights)
+        return [
+            {
+                "url": self.urls[i],
+                "listing_id": self.listing_ids[i],
+                "score": float(scores[i]),
+                "signals": {
+                    signal: None if np.isnan(self.columns[signal][i]) else float(self.columns[signal][i])
+                    for signal in SIGNALS
+                },
+            }
+            for i in self.top_k(k, weights)
+        ]
+
+
+def _price_fit(prices: np.ndarray, price_min: Optional[float], price_max: Optional[float]) -> np.ndarray:
+    """
+    1 inside the asked price range, falling linearly to 0 at twice the maximum or at no cost.
+    """
+    if not price_min and not price_max:
+        return np.full(len(prices), np.nan)
+    fit = np.ones(len(prices))
+    if price_max:
+        fit = np.where(prices > price_max, 1 - (prices - price_max) / price_max, fit)
+    if price_min:
+        fit = np.where(prices < price_min, 1 - (price_min - prices) / price_min, fit)
+    return np.where(np.isnan(prices), np.nan, np.clip(fit, 0, 1))
+
+
+def _review_count(review_counts: np.ndarray) -> np.ndarray:
+    """
+    Log-scaled review count relative to the most reviewed candidate.
+    """
+    if np.all(np.isnan(review_counts)):
+        return review_counts
+    most = np.log1p(np.nanmax(review_counts))
+    if most == 0:
+        return np.where(np.isnan(review_counts), np.nan, 0.0)
+    return np.log1p(review_counts) / most
+
+
+def _distance(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Closeness to the middle of the search results.
+
+    The searched location is never geocoded, but Airbnb returns results around it, so the
+    median of the candidates' coordinates stands in for it.
+    """
+    located = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    if located.sum() < 2:
+        return np.full(len(latitudes), np.nan)
+    center_lat, center_lng = np.radians(np.median(latitudes[located])), np.radians(np.median(longitudes[located]))
+    lat, lng = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat - center_lat) / 2) ** 2 + np.cos(lat) * np.cos(center_lat) * np.sin((lng - center_lng) / 2) ** 2
+    distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    return 1 / (1 + distance_km / DISTANCE_SCALE_KM)
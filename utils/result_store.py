@@ -0,0 +1,412 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from utils.listing_cache import canonical_listing_id
+from config import DATABASE, DATABASE_POOL_SIZE, DATABASE_BUSY_TIMEOUT
+
+
+class ConnectionPool:
+    """
+    A fixed set of SQLite connections shared by every thread and event loop.
+
+    Connections use WAL mode, so searches writing their results don't block readers or each
+    other for longer than a single commit. Unlike a connection stored on Flask's `g`, a borrowed
+    connection works from agents running outside any request.
+    """
+
+    def __init__(
+        self,
+        database: str = DATABASE,
+        size: int = DATABASE_POOL_SIZE,
+        busy_timeout: int = DATABASE_BUSY_TIMEOUT,
+    ) -> None:
+        self._connections = queue.Queue()
+        for _ in range(size):
+            connection = sqlite3.connect(database, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+            self._connections.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for one transaction, committed on success and rolled back on error.
+        """
+        connection = self._connections.get()
+        try:
+            yield connection
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            self._connections.put(connection)
+
+
+class ResultStore:
+    """
+    Stores each search and the output of every stage as rows keyed by run ID and listing ID.
+
+    The run ID doubles as the result ID the agents hand to each other, so a stage reads only
+    the rows of its own run instead of decoding another stage's whole output.
+    """
+
+    def __init__(self, pool: Optional[ConnectionPool] = None) -> None:
+        self._pool = pool or ConnectionPool()
+
+    def init_schema(self, schema: str) -> None:
+        with self._pool.connection() as db:
+            db.executescript(schema)
+
+    def migrate_legacy_results(self) -> int:
+        """
+        Copy the JSON blobs of the old my_table into the normalized tables, then drop my_table.
+
+        Each blob becomes a completed run under its own ID, so result IDs handed out before the
+        upgrade still resolve. Browsing output becomes summaries and final output becomes a
+        ranking. Description and Image Analysis scores can't be told apart and were only ever
+        read within their own search, so they are not carried over.
+
+        :return: Number of blobs migrated
+        """
+        with self._pool.connection() as db:
+            if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'my_table'").fetchone() is None:
+                return 0
+            migrated = 0
+            now = time.time()
+            for result_id, data in db.execute("SELECT id, data FROM my_table").fetchall():
+                try:
+                    entries = json.loads(data)
+                except (TypeError, ValueError):
+                    continue
+                if not isinstance(entries, list) or not all(isinstance(entry, dict) and 'url' in entry and 'summary' in entry for entry in entries):
+                    continue
+                db.execute(
+                    "INSERT OR IGNORE INTO runs (id, status, created_at, finished_at) VALUES (?, 'completed', ?, ?)",
+                    (result_id, now, now),
+                )
+                if entries and all('image_urls' in entry for entry in entries):
+                    _insert_summaries(db, result_id, entries, now)
+                else:
+                    _insert_ranking(db, result_id, entries, now)
+                migrated += 1
+            db.execute("DROP TABLE my_table")
+        return migrated
+
+    def create_run(self, run_id: str, criteria: Optional[str]) -> None:
+        with self._pool.connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO runs (id, criteria, status, created_at) VALUES (?, ?, 'running', ?)",
+                (run_id, criteria, time.time()),
+            )
+
+    def finish_run(self, run_id: str, status: str) -> None:
+        with self._pool.connection() as db:
+            db.execute(
+                "UPDATE runs SET status = ?, finished_at = ? WHERE id = ?",
+                (status, time.time(), run_id),
+            )
+
+    def save_summaries(self, run_id: str, listings: list[dict]) -> None:
+        """
+        :param listings: Dictionaries with url, summary, image_urls and optionally facts, in browsing order
+        """
+        with self._pool.connection() as db:
+            _insert_summaries(db, run_id, listings)
+
+    def get_summaries(self, run_id: str) -> list[dict]:
+        """
+        :return: Dictionaries with url, summary, image_urls and facts, in browsing order
+        """
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT s.url, s.summary, s.image_urls, l.facts FROM summaries s "
+                "LEFT JOIN listings l ON l.id = s.listing_id "
+                "WHERE s.run_id = ? ORDER BY s.position",
+                (run_id,),
+            ).fetchall()
+        return [
+            {
+                "url": url,
+                "summary": summary,
+                "image_urls": json.loads(image_urls),
+                "facts": json.loads(facts) if facts else None,
+            }
+            for url, summary, image_urls, facts in rows
+        ]
+
+    def get_image_urls(self, run_id: str) -> dict[str, list[str]]:
+        """
+        :return: Image URLs keyed by listing URL, in browsing order
+        """
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT url, image_urls FROM summaries WHERE run_id = ? ORDER BY position",
+                (run_id,),
+            ).fetchall()
+        return {url: json.loads(image_urls) for url, image_urls in rows}
+
+    def get_listing_images(self, urls: list[str]) -> dict[str, list[str]]:
+        """
+        Look up the image URLs most recently stored for each listing by any run.
+
+        :param urls: Any URLs of the listings
+        :return: Image URLs keyed by the given URL, for listings that have been browsed
+        """
+        listing_ids = list(dict.fromkeys(canonical_listing_id(url) for url in urls))
+        if not listing_ids:
+            return {}
+        placeholders = ", ".join("?" * len(listing_ids))
+        with self._pool.connection() as db:
+            rows = db.execute(
+                f"SELECT listing_id, image_urls, MAX(rowid) FROM summaries WHERE listing_id IN ({placeholders}) GROUP BY listing_id",
+                listing_ids,
+            ).fetchall()
+        images = {listing_id: json.loads(image_urls) for listing_id, image_urls, _ in rows}
+        return {url: images[canonical_listing_id(url)] for url in urls if canonical_listing_id(url) in images}
+
+    def save_description_scores(self, run_id: str, scores: dict[str, dict]) -> None:
+        """
+        :param scores: Dictionaries with score and reasoning keyed by listing URL
+        """
+        with self._pool.connection() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO description_scores (run_id, listing_id, url, score, reasoning) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (run_id, canonical_listing_id(url), url, result['score'], result['reasoning'])
+                    for url, result in scores.items()
+                ],
+            )
+
+    def get_description_scores(self, run_id: str) -> dict[str, dict]:
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT url, score, reasoning FROM description_scores WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+        return {url: {'score': score, 'reasoning': reasoning} for url, score, reasoning in rows}
+
+    def save_image_scores(self, run_id: str, scores: dict[str, dict]) -> None:
+        """
+        :param scores: Dictionaries with score, reasoning and optionally latency keyed by listing URL
+        """
+        with self._pool.connection() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO image_scores (run_id, listing_id, url, score, reasoning, latency) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, canonical_listing_id(url), url, result['score'], result['reasoning'], result.get('latency'))
+                    for url, result in scores.items()
+                ],
+            )
+
+    def get_image_scores(self, run_id: str) -> dict[str, dict]:
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT url, score, reasoning FROM image_scores WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+        return {url: {'score': score, 'reasoning': reasoning} for url, score, reasoning in rows}
+
+    def save_ranking(self, run_id: str, ranking: list[dict]) -> None:
+        """
+        :param ranking: Dictionaries with url and summary, best match first
+        """
+        with self._pool.connection() as db:
+            _insert_ranking(db, run_id, ranking)
+
+    def get_ranking(self, run_id: str) -> Optional[list[dict]]:
+        """
+        :return: Dictionaries with url and summary, best match first, or None if the run has no ranking
+        """
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT url, summary FROM rankings WHERE run_id = ? ORDER BY rank",
+                (run_id,),
+            ).fetchall()
+            if not rows:
+                # An empty ranking is still a ranking if the Ranking Agent got to store it
+                ranked = db.execute("SELECT 1 FROM runs WHERE id = ? AND ranked_at IS NOT NULL", (run_id,)).fetchone()
+                if ranked is None:
+                    return None
+        return [{'url': url, 'summary': summary} for url, summary in rows]
+
+    # Retention
+
+    def interrupt_unfinished_runs(self) -> int:
+        """
+        Mark runs left running by a previous process as interrupted.
+
+        :return: Number of runs marked
+        """
+        with self._pool.connection() as db:
+            return db.execute(
+                "UPDATE runs SET status = 'interrupted', finished_at = ? WHERE status = 'running'",
+                (time.time(),),
+            ).rowcount
+
+    def expired_run_ids(self, created_before: float) -> list[str]:
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT id FROM runs WHERE created_at < ? AND status != 'running' ORDER BY created_at",
+                (created_before,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def oldest_run_ids(self, limit: int) -> list[str]:
+        with self._pool.connection() as db:
+            rows = db.execute(
+                "SELECT id FROM runs WHERE status != 'running' ORDER BY created_at LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def results_size(self) -> int:
+        """
+        Approximate number of bytes held by stored run results.
+        """
+        with self._pool.connection() as db:
+            return db.execute(
+                """
+                SELECT
+                    (SELECT COALESCE(SUM(LENGTH(summary) + LENGTH(image_urls) + LENGTH(url)), 0) FROM summaries)
+                    + (SELECT COALESCE(SUM(LENGTH(reasoning) + LENGTH(url)), 0) FROM description_scores)
+                    + (SELECT COALESCE(SUM(LENGTH(reasoning) + LENGTH(url)), 0) FROM image_scores)
+                    + (SELECT COALESCE(SUM(LENGTH(summary) + LENGTH(url)), 0) FROM rankings)
+                    + (SELECT COALESCE(SUM(LENGTH(facts) + LENGTH(url)), 0) FROM listings)
+                """
+            ).fetchone()[0]
+
+    def export_runs(self, run_ids: list[str]) -> list[dict]:
+        """
+        Collect everything stored for the given runs, for archiving.
+        """
+        runs = []
+        with self._pool.connection() as db:
+            for run_id in run_ids:
+                row = db.execute(
+                    "SELECT criteria, status, created_at, finished_at FROM runs WHERE id = ?",
+                    (run_id,),
+                ).fetchone()
+                if row is None:
+                    continue
+                criteria, status, created_at, finished_at = row
+                runs.append({
+                    "id": run_id,
+                    "criteria": criteria,
+                    "status": status,
+                    "created_at": created_at,
+                    "finished_at": finished_at,
+                    "summaries": [
+                        {"url": url, "summary": summary, "image_urls": json.loads(image_urls)}
+                        for url, summary, image_urls in db.execute(
+                            "SELECT url, summary, image_urls FROM summaries WHERE run_id = ? ORDER BY position",
+                            (run_id,),
+                        )
+                    ],
+                    "description_scores": {
+                        url: {"score": score, "reasoning": reasoning}
+                        for url, score, reasoning in db.execute(
+                            "SELECT url, score, reasoning FROM description_scores WHERE run_id = ?",
+                            (run_id,),
+                        )
+                    },
+                    "image_scores": {
+                        url: {"score": score, "reasoning": reasoning}
+                        for url, score, reasoning in db.execute(
+                            "SELECT url, score, reasoning FROM image_scores WHERE run_id = ?",
+                            (run_id,),
+                        )
+                    },
+                    "ranking": [
+                        {"url": url, "summary": summary}
+                        for url, summary in db.execute(
+                            "SELECT url, summary FROM rankings WHERE run_id = ? ORDER BY rank",
+                            (run_id,),
+                        )
+                    ],
+                })
+        return runs
+
+    def delete_runs(self, run_ids: list[str]) -> None:
+        """
+        Delete the given runs with all their results, then any listing no remaining run refers to.
+        """
+        with self._pool.connection() as db:
+            for table, column in (
+                ("rankings", "run_id"),
+                ("image_scores", "run_id"),
+                ("description_scores", "run_id"),
+                ("summaries", "run_id"),
+                ("runs", "id"),
+            ):
+                db.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(run_id,) for run_id in run_ids])
+            db.execute("DELETE FROM listings WHERE id NOT IN (SELECT listing_id FROM summaries)")
+
+    def compact(self, vacuum_free_ratio: float) -> bool:
+        """
+        Checkpoint the WAL and rebuild the database file once enough of it is free pages.
+
+        :param vacuum_free_ratio: Fraction of free pages above which the file is vacuumed
+        :return: Whether the database was vacuumed
+        """
+        with self._pool.connection() as db:
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            page_count = db.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+            vacuum = page_count > 0 and free_pages / page_count >= vacuum_free_ratio
+            if vacuum:
+                db.execute("VACUUM")
+                db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            db.execute("PRAGMA optimize")
+        return vacuum
+
+
+def _insert_summaries(db: sqlite3.Connection, run_id: str, listings: list[dict], now: Optional[float] = None) -> None:
+    now = now or time.time()
+    for position, listing in enumerate(listings):
+        listing_id = canonical_listing_id(listing['url'])
+        facts = listing.get('facts')
+        db.execute(
+            "INSERT INTO listings (id, url, title, facts, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET url = excluded.url, "
+            "title = COALESCE(excluded.title, title), facts = COALESCE(excluded.facts, facts), "
+            "updated_at = excluded.updated_at",
+            (listing_id, listing['url'], facts.get('title') if facts else None, json.dumps(facts) if facts else None, now),
+        )
+        db.execute(
+            "INSERT OR REPLACE INTO summaries (run_id, listing_id, position, url, summary, image_urls) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, listing_id, position, listing['url'], listing['summary'], json.dumps(listing['image_urls'])),
+        )
+
+
+def _insert_ranking(db: sqlite3.Connection, run_id: str, ranking: list[dict], now: Optional[float] = None) -> None:
+    db.execute("DELETE FROM rankings WHERE run_id = ?", (run_id,))
+    db.executemany(
+        "INSERT INTO rankings (run_id, rank, listing_id, url, summary) VALUES (?, ?, ?, ?, ?)",
+        [
+            (run_id, rank, canonical_listing_id(entry['url']), entry['url'], entry['summary'])
+            for rank, entry in enumerate(ranking, start=1)
+        ],
+    )
+    db.execute("UPDATE runs SET ranked_at = ? WHERE id = ?", (now or time.time(), run_id))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> ResultStore:
+    """
+    Return the process-wide result store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore()
+        return _store
@@ -0,0 +1,130 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Optional
+from utils.result_store import ResultStore, get_result_store
+from config import (
+    RUN_RETENTION_TTL,
+    RUN_RETENTION_MAX_BYTES,
+    RETENTION_INTERVAL,
+    RUN_ARCHIVE_DIR,
+    VACUUM_FREE_RATIO,
+)
+
+# Runs removed per step when shrinking the results below the size cap
+EVICTION_BATCH_SIZE = 50
+
+
+class RetentionManager:
+    """
+    Periodically removes old runs from the result store and compacts the database.
+
+    Runs older than `ttl` seconds are removed, then the oldest finished runs until the stored
+    results fit in `max_bytes`. Removed runs are written to a gzipped JSON lines file in
+    `archive_dir` first when one is configured. Afterwards the WAL is checkpointed and the
+    database vacuumed if enough of it has become free space.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ResultStore] = None,
+        ttl: float = RUN_RETENTION_TTL,
+        max_bytes: int = RUN_RETENTION_MAX_BYTES,
+        interval: float = RETENTION_INTERVAL,
+        archive_dir: Optional[str] = RUN_ARCHIVE_DIR,
+        vacuum_free_ratio: float = VACUUM_FREE_RATIO,
+    ) -> None:
+        self._store = store or get_result_store()
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._interval = interval
+        self._archive_dir = archive_dir
+        self._vacuum_free_ratio = vacuum_free_ratio
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs_deleted = 0
+        self.runs_archived = 0
+        self.vacuums = 0
+        self.last_run_at = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def run_once(self) -> None:
+        """
+        Apply the retention policy and compact the database once.
+        """
+        expired = self._store.expired_run_ids(time.time() - self._ttl)
+        if expired:
+            self._remove(expired)
+
+        while self._store.results_size() > self._max_bytes:
+            oldest = self._store.oldest_run_ids(EVICTION_BATCH_SIZE)
+            if not oldest:
+                break
+            self._remove(oldest)
+
+        if self._store.compact(self._vacuum_free_ratio):
+            self.vacuums += 1
+        self.last_run_at = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "runs_deleted": self.runs_deleted,
+            "runs_archived": self.runs_archived,
+            "vacuums": self.vacuums,
+            "results_bytes": self._store.results_size(),
+            "last_run_at": self.last_run_at,
+        }
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error applying result retention: {repr(e)}")
+            self._stop.wait(self._interval)
+
+    def _remove(self, run_ids: list[str]) -> None:
+        if self._archive_dir:
+            self._archive(run_ids)
+        self._store.delete_runs(run_ids)
+        self.runs_deleted += len(run_ids)
+        print(f"Removed {len(run_ids)} stored runs")
+
+    def _archive(self, run_ids: list[str]) -> None:
+        runs = self._store.export_runs(run_ids)
+        os.makedirs(self._archive_dir, exist_ok=True)
+        path = os.path.join(self._archive_dir, f"runs-{time.strftime('%Y%m%d-%H%M%S')}-{run_ids[0]}.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for run in runs:
+                f.write(json.dumps(run) + "\n")
+        self.runs_archived += len(runs)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_retention_manager() -> RetentionManager:
+    """
+    Return the process-wide retention manager.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = RetentionManager()
+            atexit.register(_manager.stop)
+        return _manager
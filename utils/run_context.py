@@ -0,0 +1,91 @@
+import json
+from typing import Optional
+from pydantic import BaseModel, PrivateAttr
+from utils.events import EventStream
+
+
+class RunContext(BaseModel):
+    """
+    Typed state handed between agents during a single search.
+
+    Each agent reads its inputs from here and records its outputs for the next stage, so values
+    that are already known never have to be re-extracted from the chat history by an LLM. Agents
+    fall back to parsing the chat history only when a field they need is missing.
+    """
+    criteria: Optional[str] = None
+    parsed_fields: Optional[dict] = None
+    start_url: Optional[str] = None
+    listing_urls: Optional[list[str]] = None
+    browsing_result_id: Optional[str] = None
+    description_result_id: Optional[str] = None
+    image_result_id: Optional[str] = None
+    final_result_id: Optional[str] = None
+    summarized_listings: list[dict] = []
+    filtered_listings: list[dict] = []  # Listings dropped by the hard filters, with the reasons
+    prefiltered_urls: Optional[list[str]] = None  # Listings kept by the embedding pre-filter, if it ran
+
+    _event_stream: Optional[EventStream] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_user_prefs(cls, user_prefs: dict, final_result_id: str) -> "RunContext":
+        return cls(criteria=format_criteria(user_prefs), final_result_id=final_result_id)
+
+    def has(self, *fields: str) -> bool:
+        """
+        Check whether every given field has been filled in.
+        """
+        return all(getattr(self, field) for field in fields)
+
+    def set_event_stream(self, event_stream: EventStream) -> None:
+        self._event_stream = event_stream
+
+    def publish(self, event_type: str, **data) -> None:
+        """
+        Report a progress event to clients following the search, if any.
+        """
+        if self._event_stream is not None:
+            self._event_stream.publish(event_type, **data)
+
+    def progress(self) -> dict:
+        """
+        Summarize what the search has produced so far, for clients polling a running job.
+        """
+        return {
+            "listing_urls": self.listing_urls or [],
+            "summarized_listings": [
+                {"url": listing["url"], "summary": listing["summary"]}
+                for listing in list(self.summarized_listings)
+            ],
+            "filtered_listings": list(self.filtered_listings),
+        }
+
+
+def format_criteria(user_prefs: dict) -> str:
+    """
+    Turn the search form fields into the criteria string the agents work with.
+    """
+    labels = {
+        "location": "Location",
+        "checkIn": "Check in",
+        "checkOut": "Check out",
+        "additionalInfo": "Additional preferences",
+    }
+    parts = [f"{labels.get(key, key)}: {value}" for key, value in user_prefs.items() if value]
+    return "\n".join(parts)
+
+
+def normalize_user_prefs(user_prefs: dict) -> str:
+    """
+    Reduce the search form fields to a key that is equal for equivalent searches.
+
+    Empty fields are dropped and text is lowercased with whitespace collapsed. The API key is
+    never part of the key.
+    """
+    normalized = {}
+    for key, value in user_prefs.items():
+        if key == "key" or value in (None, ""):
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True)
@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+from config import SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_ENTRIES
+
+
+class SearchResultCache:
+    """
+    Short-lived in-memory cache of listing URLs found on Airbnb search pages.
+
+    Keys are the normalized search filters, so repeated and near-identical searches skip
+    rendering the search page entirely.
+    """
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_MAX_ENTRIES) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[list[str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self._ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: Hashable, listing_urls: list[str]) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), list(listing_urls))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchResultCache:
+    """
+    Return the process-wide search result cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SearchResultCache()
+        return _cache
@@ -0,0 +1,94 @@
+import asyncio
+from config import MAX_LLM_CALLS, MAX_IMAGE_SCORING_CALLS
+
+
+class StreamingScorer:
+    """
+    Scores listings as soon as their summaries land instead of waiting for the whole browsing stage.
+
+    Each submitted listing is scored by description and by images concurrently. Results are collected
+    per listing URL in the same shape the Description and Image Analysis agents store, so the ranking
+    stage can consume them unchanged.
+
+    Scoring calls are limited like in the batch stages, so a crawl of many listings doesn't start
+    all of its LLM and vision calls at once.
+    """
+
+    def __init__(
+        self,
+        criteria: str,
+        score_description,
+        score_images,
+        on_scored=None,
+        max_llm_calls: int = MAX_LLM_CALLS,
+        max_image_scoring_calls: int = MAX_IMAGE_SCORING_CALLS,
+    ) -> None:
+        """
+        :param criteria: The user's preferences
+        :param score_description: Coroutine function (criteria, summary) -> object with score and reasoning
+        :param score_images: Coroutine function (criteria, image_urls) -> object with score and reasoning
+        :param on_scored: Optional callback (kind, url, score) invoked with "description" or "image"
+            as each score lands
+        :param max_llm_calls: Maximum number of descriptions scored at once
+        :param max_image_scoring_calls: Maximum number of listings' images scored at once
+        """
+        self._criteria = criteria
+        self._score_description = score_description
+        self._score_images = score_images
+        self._on_scored = on_scored
+        self._description_semaphore = asyncio.Semaphore(max_llm_calls)
+        self._image_semaphore = asyncio.Semaphore(max_image_scoring_calls)
+        self._tasks = []
+        self.description_results = {}
+        self.image_results = {}
+
+    def submit(self, listing: dict) -> None:
+        """
+        Start scoring a summarized listing in the background.
+
+        :param listing: Dictionary with url, summary and image_urls
+        """
+        self._tasks.append(asyncio.create_task(self._score(listing)))
+
+    async def drain(self) -> tuple[dict, dict]:
+        """
+        Wait for every submitted listing to be scored.
+
+        :return: Tuple of (description_results, image_results) keyed by listing URL
+        """
+        await asyncio.gather(*self._tasks)
+        return self.description_results, self.image_results
+
+    async def _score(self, listing: dict) -> None:
+        url = listing['url']
+        description_output, image_output = await asyncio.gather(
+            self._limited(self._description_semaphore, self._score_description(self._criteria, listing['summary'])),
+            self._limited(self._image_semaphore, self._score_images(self._criteria, listing['image_urls'])),
+            return_exceptions=True,
+        )
+
+        if isinstance(description_output, Exception):
+            print(f"Error scoring description of {url}: {description_output}")
+        else:
+            self.description_results[url] = {
+                'score': description_output.score,
+                'reasoning': description_output.reasoning,
+            }
+            if self._on_scored:
+                self._on_scored("description", url, description_output.score)
+
+        if isinstance(image_output, Exception):
+            print(f"Error scoring images of {url}: {image_output}")
+        else:
+            self.image_results[url] = {
+                'score': image_output.score,
+                'reasoning': image_output.reasoning,
+            }
+            if self._on_scored:
+                self._on_scored("image", url, image_output.score)
+        print(f"Scored listing {url}")
+
+    @staticmethod
+    async def _limited(semaphore: asyncio.Semaphore, call):
+        async with semaphore:
+            return await call
@@ -0,0 +1,190 @@
+import re
+from config import MODEL_NAME, SUMMARY_TOKEN_BUDGET
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+# Navigation, footer and UI lines that carry nothing about the listing itself
+BOILERPLATE_PATTERNS = [
+    r"skip to content",
+    r"show (more|all.*|less|original)",
+    r"translated from .*|translate",
+    r"(log in|sign up|become a host|airbnb your home)",
+    r"(help center|aircover|anti-discrimination|disability support|cancellation options|report neighborhood concern)",
+    r"(hosting resources|community forum|hosting responsibly|join a free hosting class|find a co-host)",
+    r"(newsroom|new features|careers|investors|gift cards|airbnb\.org emergency stays|airbnb\.org)",
+    r"(support|hosting|airbnb|privacy|terms|sitemap|company details|your privacy choices)",
+    r"(english \(us\)|\$ ?usd|usd)",
+    r"© \d{4} airbnb, inc\.?",
+    r"report this listing",
+    r"(share|save|photos?|reserve|you won't be charged yet)",
+    r"(amenities|reviews|location)",  # Navigation tabs
+    r"·",
+]
+BOILERPLATE_PATTERN = re.compile(r"^(" + "|".join(BOILERPLATE_PATTERNS) + r")$", re.IGNORECASE)
+REVIEWS_HEADING_PATTERN = re.compile(
+    r"^(reviews?:?|guest reviews|(★\s*)?(\d(\.\d+)?\s*·\s*)?[\d,]+ reviews?)$",
+    re.IGNORECASE,
+)
+# Every review shows when it was written, right below the reviewer's name
+REVIEW_DATE_PATTERN = re.compile(
+    r"\b((january|february|march|april|may|june|july|august|september|october|november|december) \d{4}"
+    r"|(\d+|a|an) (days?|weeks?|months?|years?) ago)\b",
+    re.IGNORECASE,
+)
+SECTION_HEADING_PATTERN = re.compile(
+    r"^(where you'll (be|sleep)|meet your host|things to know|what this place offers|about this (place|space)"
+    r"|house rules|safety & property|cancellation policy|availability)$",
+    re.IGNORECASE,
+)
+# Lines after a reviews heading searched for the first review's date
+REVIEW_LOOKAHEAD = 4
+# Lines above a review's date that can be the reviewer's name and home town
+REVIEW_HEADER_LINES = 2
+# Lines stating guests, rooms, beds, baths, price or rating, and the labelled facts written by
+# format_listing_facts. Headings and amenity items stay in place with the rest of the page.
+KEY_FACT_PATTERN = re.compile(
+    r"^(title|property type|price|rating|capacity|location):"
+    r"|[$€£] ?\d"
+    r"|\b\d+(\.\d+)? (guests?|bedrooms?|beds?|baths?|bathrooms?|private baths?|shared baths?|nights?)\b"
+    r"|★ ?\d|\b\d\.\d+ (·|out of 5)"
+    r"|\bsuperhost\b",
+    re.IGNORECASE,
+)
+
+_encoding = None
+# Stands in for the encoding once loading it failed, e.g. offline without a cached BPE file
+_ENCODING_UNAVAILABLE = object()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens locally with the model's tokenizer, or estimate them when tiktoken is unavailable.
+    """
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.encoding_for_model(MODEL_NAME)
+        except Exception as e:
+            print(f"Estimating token counts, could not load the tokenizer: {repr(e)}")
+            _encoding = _ENCODING_UNAVAILABLE
+    if tiktoken is not None and _encoding is not _ENCODING_UNAVAILABLE:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def compact_listing_text(text: str, token_budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """
+    Fit scraped listing text into a token budget before summarization.
+
+    Boilerplate and repeated lines are removed. The remaining lines are kept in order of
+    importance (key facts, then description, then reviews with the most detailed first)
+    until the budget is spent. A review is kept or dropped whole, with its reviewer and date.
+
+    :param text: Scraped listing text, one item per line
+    :param token_budget: Maximum number of tokens to keep
+    :return: The compacted text
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line and not BOILERPLATE_PATTERN.match(line)]
+
+    seen = set()
+    key_facts, description, review_lines = [], [], []
+    in_reviews = False
+    for i, line in enumerate(lines):
+        if _starts_reviews(lines, i):
+            in_reviews = True
+            continue
+        if in_reviews and SECTION_HEADING_PATTERN.match(line):
+            in_reviews = False
+        if in_reviews:
+            # Names and dates repeat across reviews, so reviews are deduplicated whole below
+            review_lines.append(line)
+            continue
+        normalized = line.lower()
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+
+        if KEY_FACT_PATTERN.search(line) and len(line) < 200:
+            key_facts.append([line])
+        else:
+            description.append([line])
+
+    reviews = list({tuple(block): block for block in _review_blocks(review_lines)}.values())
+    reviews.sort(key=lambda block: sum(len(line) for line in block), reverse=True)
+
+    kept = []
+    used_tokens = 0
+    for heading, blocks in ((None, key_facts), (None, description), ("Reviews:", reviews)):
+        for block in blocks:
+            block_tokens = sum(count_tokens(line) + 1 for line in block)  # Newlines
+            if used_tokens + block_tokens > token_budget:
+                continue
+            if heading:
+                kept.append(heading)
+                heading = None
+            kept.extend(block)
+            used_tokens += block_tokens
+
+    compacted = "\n".join(kept)
+    print(f"Compacted listing text from {count_tokens(text)} to {count_tokens(compacted)} tokens")
+    return compacted
+
+
+def _starts_reviews(lines: list[str], i: int) -> bool:
+    """
+    Whether `lines[i]` is the heading of the reviews section.
+
+    "Reviews" also shows up in the page's navigation tabs and next to the title, so a heading
+    only counts when the date line of a first review follows it before any other section.
+    """
+    if lines[i] == "Reviews:":  # Written by format_listing_facts
+        return True
+    if not REVIEWS_HEADING_PATTERN.match(lines[i]):
+        return False
+    for line in lines[i + 1:i + 1 + REVIEW_LOOKAHEAD]:
+        if REVIEWS_HEADING_PATTERN.match(line) or SECTION_HEADING_PATTERN.match(line):
+            return False
+        if len(line) < 80 and REVIEW_DATE_PATTERN.search(line):
+            return True
+    return False
+
+
+def _review_blocks(lines: list[str]) -> list[list[str]]:
+    """
+    Group the lines of the reviews section into one block per review, in page order.
+
+    Each review's date line anchors its block, which starts at the reviewer's name above the
+    date and runs until the next reviewer's name. Reviews without dates, like the bullets
+    written by format_listing_facts, are a line each.
+    """
+    dates = [i for i, line in enumerate(lines) if len(line) < 80 and REVIEW_DATE_PATTERN.search(line)]
+    if not dates:
+        return [[line] for line in lines]
+
+    starts = []
+    previous_date = None
+    for date in dates:
+        if previous_date is not None and date == previous_date + 1:
+            continue  # A second date line of the same review
+        # Leave the review above at least one line of text
+        floor = 0 if previous_date is None else previous_date + 2
+        start = date
+        while start > floor and date - start < REVIEW_HEADER_LINES and _is_review_header(lines[start - 1]):
+            start -= 1
+        starts.append(start)
+        previous_date = date
+
+    bounds = [0] + starts + [len(lines)]
+    return [lines[start:end] for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _is_review_header(line: str) -> bool:
+    """
+    Whether a line above a review's date reads like a reviewer's name or home town rather than
+    the end of the previous review's text.
+    """
+    return len(line) < 50 and not line.endswith((".", "!", "?", ")", '"'))